@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -12,11 +11,13 @@ modules yourself. Start by modifying the 'on_turn' function.
 
 Advanced strategy tips: 
 
-  - You can analyze action frames by modifying on_action_frame function
+  - You can analyze action frames by modifying on_action_frame function, or
+  follow only their events with subscribe, as on_breach does
 
   - The GameState.map object can be manually manipulated to create hypothetical 
   board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  the actual current map state. game_state.fork() makes a cheap copy that
+  can be changed freely.
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
@@ -32,17 +33,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         Read in config and perform any initial setup here 
         """
         gamelib.debug_write('Configuring your custom algo strategy...')
+        # Compiled once by AlgoCore, every GameState of the game shares it
         self.config = config
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, MP, SP
-        WALL = config["unitInformation"][0]["shorthand"]
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        TURRET = config["unitInformation"][2]["shorthand"]
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-
-        MP = 1
-        SP = 0
+        WALL = config.WALL
+        SUPPORT = config.SUPPORT
+        TURRET = config.TURRET
+        SCOUT = config.SCOUT
+        DEMOLISHER = config.DEMOLISHER
+        INTERCEPTOR = config.INTERCEPTOR
+
+        MP = config.MP
+        SP = config.SP
         
         # This is a good place to do initial setup
         self.scored_on_locations = []
@@ -55,6 +57,16 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.need_rebuild = {}
         self.prev_line=0
         self.ready_to_fire =False 
+        # Attack plans are simulated on spare cores, results later than plan_timeout seconds are dropped
+        self.plan_evaluator = gamelib.PlanEvaluator()
+        self.plan_evaluator.start()
+        self.plan_timeout = 0.5
+        # Submits the turn planned so far if the strategy runs past the engine's time limit
+        self.scheduler = gamelib.TurnScheduler(config)
+        # Prepares paths and threat grids for the next turn while the action phase plays out, when GAMELIB_PRECOMPUTE is set
+        self.precomputer = gamelib.Precomputer() if gamelib.precompute.ENABLED else None
+        # Only breaches are read from the action frames
+        self.subscribe("breach", self.on_breach)
         
         global ourlocations
         ourlocations =  [[i,j] for i in range(14) for j in range(13-i,13+i+2)]
@@ -71,10 +83,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         game_state = gamelib.GameState(self.config, turn_state)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
+        if self.precomputer is not None:
+            self.precomputer.adopt(game_state)
 
-        self.starter_strategy(game_state)
-
-        game_state.submit_turn()
+        submitted = self.scheduler.run_turn(game_state, [self.starter_strategy], self.turn_start)
+        if self.precomputer is not None:
+            self.precomputer.start(submitted)
 
 
     """
@@ -90,6 +104,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         If there are no stationary units to attack in the front, we will send Scouts to try and score quickly.
         """
         attack_rounds = list(range(6,102,3))
+        # Keeps each finished step, so running out of time still submits what was built so far
+        commit = self.scheduler.commit
         
 
    
@@ -98,20 +114,26 @@ class AlgoStrategy(gamelib.AlgoCore):
         if game_state.turn_number < 101:
             self.rebuilding(game_state)
             self.remove_damaged(game_state, ourlocations, 20)
+            commit(game_state)
             
             if self.line==0:
                 self.best_line_location(game_state)
                 if self.ready_to_fire:                   
                     self.default_attack(game_state)
+                    commit(game_state)
                 self.default_opening_defence(game_state, attack_rounds)
+                commit(game_state)
                 self.remove_line(game_state)
             else:
                 self.demolishing_defence(game_state)
+                commit(game_state)
                 self.demolisher_attack(game_state)
+                commit(game_state)
                 self.best_line_location(game_state)
                 self.remove_line(game_state)
         elif (self.left_removed==True) & (self.just_attacked==False):
             self.attack_left(game_state)
+            commit(game_state)
             self.defend_right(game_state)
             
         elif (self.left_removed==True) & (self.just_attacked==True):
@@ -120,6 +142,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             self.just_attacked= False
         elif (self.right_removed==True) & (self.just_attacked==False):
             self.attack_right(game_state)
+            commit(game_state)
             self.defend_left(game_state)
             
         elif (self.right_removed==True) & (self.just_attacked==True):
@@ -128,9 +151,11 @@ class AlgoStrategy(gamelib.AlgoCore):
             self.just_attacked= False
         elif (self.detect_enemy_unit(game_state, unit_type=None, valid_x=[[0,1]], valid_y=[14])==2):
             self.remove_left_defence(game_state)
+            commit(game_state)
             self.defend_right(game_state)
         elif (self.detect_enemy_unit(game_state, unit_type=None, valid_x=[26,27], valid_y=[14])==2) :
             self.remove_right_defence(game_state)
+            commit(game_state)
             self.defend_left(game_state)
         else:
             self.build_defences(game_state)
@@ -334,13 +359,14 @@ class AlgoStrategy(gamelib.AlgoCore):
         estimate the path's damage risk.
         """
         damages = []
+        turret_damage = gamelib.GameUnit(TURRET, game_state.config).damage_i
         # Get the damage estimate each path will take
         for location in location_options:
             path = game_state.find_path_to_edge(location)
             damage = 0
             for path_location in path:
                 # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
+                damage += len(game_state.get_attackers(path_location, 0)) * turret_damage
             damages.append(damage)
         
         # Now just return the location that takes the least damage
@@ -352,7 +378,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         enemy_mob = game_state.get_resource(MP,1)
         n_interceptors = min(math.floor(enemy_mob),2) 
         n_demolishers = math.floor((my_mob-n_interceptors)/3)
-        damage = game_state.damage_dealt_mobile( [22,8], game_state,DEMOLISHER,n_demolishers,player_index=0)
+        _, damage = self.plan_evaluator.best_plan(game_state, [[(DEMOLISHER, [22, 8], n_demolishers)]], self.plan_budget())
+        damage = damage or 0
         game_state.attempt_spawn(INTERCEPTOR, [22, 8], n_interceptors)      
         if damage>8:
             game_state.attempt_spawn(DEMOLISHER, [5, 8], n_demolishers)
@@ -368,8 +395,8 @@ class AlgoStrategy(gamelib.AlgoCore):
             enemy_mob = game_state.get_resource(MP,1)
             n_interceptors = min(math.floor(enemy_mob),2)            
             n_demolishers = math.floor((my_mob-n_interceptors)/3)
-            damage_left = game_state.damage_dealt_mobile( [3,10], game_state,DEMOLISHER,n_demolishers,player_index=0)
-            damage_right = game_state.damage_dealt_mobile( [24,10], game_state,DEMOLISHER,n_demolishers,player_index=0)
+            plans = [[(DEMOLISHER, [3, 10], n_demolishers)], [(DEMOLISHER, [24, 10], n_demolishers)]]
+            damage_left, damage_right = [damage or 0 for damage in self.plan_evaluator.evaluate(game_state, plans, self.plan_budget())]
             if damage_left>=damage_right:
                 supports= left_support_locations
                 launch_loc = [3,10]
@@ -387,25 +414,29 @@ class AlgoStrategy(gamelib.AlgoCore):
                 game_state.attempt_remove(supports)
             self.ready_to_fire=False
             
+    def plan_budget(self):
+        """
+        Seconds to spend evaluating attack plans, plan_timeout unless the turn is running out of time.
+        """
+        return min(self.plan_timeout, self.scheduler.time_left())
+
+    def region_mask(self, valid_x = None, valid_y = None):
+        """
+        Bitboard of the tiles whose x is in valid_x and y is in valid_y, None allows any coordinate.
+        """
+        xs = range(28) if valid_x is None else [x for x in valid_x if type(x) == int]
+        ys = range(28) if valid_y is None else [y for y in valid_y if type(y) == int]
+        return gamelib.topology.locations_mask([[x, y] for x in xs for y in ys])
+
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units    
+        enemy_structures = game_state.game_map.get_structure_mask(1, unit_type)
+        return bin(enemy_structures & self.region_mask(valid_x, valid_y)).count("1")
  
 
 
     def detect_my_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 0 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        return True
-        return False
+        my_structures = game_state.game_map.get_structure_mask(0, unit_type)
+        return my_structures & self.region_mask(valid_x, valid_y) != 0
     
 
         
@@ -543,26 +574,19 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_breach(self, breach):
         """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
-        Processing the action frames is complicated so we only suggest it if you have time and experience.
+        Called for each breach in the action frames, subscribed in on_game_start.
+        The algo does not override on_action_frame, so only the events of each frame are decoded.
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
-        for breach in breaches:
-            location = breach[0]
-            unit_owner_self = True if breach[4] == 1 else False
-            # When parsing the frame data directly, 
-            # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
-            if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
-                self.scored_on_locations.append(location)
-                gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
+        # When parsing the frame data directly, 
+        # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
+        if breach.player != 1:
+            gamelib.debug_write("Got scored on at: {}".format(breach.location))
+            self.scored_on_locations.append(breach.location)
+            gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
                 
               
     def damage_to_interceptor(self, location, game_state,player_index=0):
@@ -580,18 +604,10 @@ class AlgoStrategy(gamelib.AlgoCore):
         if not player_index == 0 and not player_index == 1:
             game_state._invalid_player_index(player_index)
 
-        damage = 0
-        max_range = 3.5
         #interpath = game_state.find_path_to_edge(location)
         #pathtocorner = [i for i in interpath if i[1]<=13]
         pathtocorner = [[3,10],[3,11],[2,11],[2,12],[1,12],[1,13]]
-        for path_point in pathtocorner:
-            possible_turrets= game_state.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in game_state.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and game_state.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + 4*unit.damage_i #change 4 to 1/mobileunit.speed
-        return damage 
+        return game_state.get_threat_grid(player_index).path_damage(pathtocorner, 4) #change 4 to 1/mobileunit.speed
 
     def damage_to_scout(self, location, game_state,player_index=0):
         """Gets the damage to a unit released from location
@@ -608,17 +624,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         if not player_index == 0 and not player_index == 1:
             game_state._invalid_player_index(player_index)
 
-        damage = 0
-        max_range = 3.5
-
         scoutpath = game_state.find_path_to_edge(location)
-        for path_point in scoutpath:
-            possible_turrets= game_state.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in game_state.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and game_state.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + unit.damage_i #change 4 to 1/mobileunit.speed
-        return damage 
+        return game_state.get_threat_grid(player_index).path_damage(scoutpath)
 
     def damage_to_interceptor(self, location, game_state,player_index=0):
         """Gets the damage to a unit released from location
@@ -635,26 +642,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         if not player_index == 0 and not player_index == 1:
             game_state._invalid_player_index(player_index)
 
-        damage = 0
-        max_range = 3.5
-
         interpath = game_state.find_path_to_edge(location)
-        for path_point in interpath:
-            possible_turrets= game_state.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in game_state.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and game_state.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + 2*unit.damage_i #change 4 to 1/mobileunit.speed
-        return damage 
+        return game_state.get_threat_grid(player_index).path_damage(interpath, 2) #change 2 to 1/mobileunit.speed
 
 
 
     def remove_damaged(self,game_state,all_locations,low_health_threshold):                                                                                                   
+        game_map = game_state.game_map
+        damaged = set(map(tuple, game_map.find_units(player_index=0, stationary=True, below_health=low_health_threshold)))
         for location in all_locations:
-            for unit in game_state.game_map[location]:                                          
-                if unit.player_index == 0 and unit.stationary and unit.health< low_health_threshold:
-                    game_state.attempt_remove(location)
-                    self.need_rebuild[(location[0],location[1]) ]= unit.unit_type 
+            if (location[0], location[1]) in damaged:
+                game_state.attempt_remove(location)
+                self.need_rebuild[(location[0],location[1]) ]= game_map[location][0].unit_type 
         
     def rebuilding(self,game_state):
         if len(self.need_rebuild )>0:
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the gamelib hot paths. Run them from the algo folder, for example:
+
+    python3 -m benchmarks.bench_navigation
+"""
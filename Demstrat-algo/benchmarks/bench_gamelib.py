@@ -0,0 +1,161 @@
+"""
+Times the gamelib hot paths on a corpus of turns and compares them with stored baselines.
+
+For each turn of the corpus it times parsing the turn into a GameState, find_path_to_edge from
+every edge tile, get_target for every unit with scouts on all free edge tiles, each damage_*
+helper from every free tile on our edges, and a full AlgoStrategy.on_turn. Each path and damage
+benchmark starts from a new GameState, so caches start cold as they do each turn.
+
+    python3 -m benchmarks.bench_gamelib                  compare with benchmarks/baselines.json
+    python3 -m benchmarks.bench_gamelib --save           store the results as the new baselines
+    python3 -m benchmarks.bench_gamelib --recording FILE time the turns of a GAMELIB_RECORD recording
+
+The exit status is 1 when a benchmark is slower than its baseline by more than the threshold.
+Baselines depend on the machine, so save them again on the machine you compare on.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+
+from gamelib import GameConfig, GameState
+
+from .common import load_config, friendly_edge_starts, best_time, best_time_fresh
+from .corpus import generated_corpus, recorded_corpus
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+
+def new_state(config, turn):
+    game_state = GameState(config, turn)
+    game_state.suppress_warnings(True)
+    return game_state
+
+
+def edge_starts(game_state):
+    game_map = game_state.game_map
+    return [location for edge in game_map.get_edges() for location in edge if not game_state.contains_stationary_unit(location)]
+
+
+def with_scouts(config, turn):
+    """A GameState with a scout of the player owning each half on every free edge tile"""
+    game_state = new_state(config, turn)
+    scout = config["unitInformation"][3]["shorthand"]
+    for location in edge_starts(game_state):
+        game_state.game_map.add_unit(scout, location, 0 if location[1] < game_state.HALF_ARENA else 1)
+    return game_state
+
+
+def find_all_paths(game_state):
+    for location in edge_starts(game_state):
+        game_state.find_path_to_edge(location)
+
+
+def target_all(game_state):
+    for location in game_state.game_map:
+        for unit in game_state.game_map[location]:
+            game_state.get_target(unit)
+
+
+def damage_from_edges(helper):
+    def run(game_state):
+        for location in friendly_edge_starts(game_state):
+            helper(game_state, location)
+    return run
+
+
+def make_algo(config):
+    import algo_strategy
+    with contextlib.redirect_stderr(io.StringIO()):
+        algo = algo_strategy.AlgoStrategy()
+        algo.on_game_start(config)
+    # The precomputer, when GAMELIB_PRECOMPUTE turns it on, reports from its own thread after on_turn returns, which would mix with the results
+    if algo.precomputer is not None:
+        algo.precomputer.enable_warnings = False
+    return algo
+
+
+def run_turn(algo, turn):
+    random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        algo.on_turn(turn)
+
+
+def benchmark_turn(config, turn, algo, repeat):
+    """Times each benchmark on one turn message
+
+    Returns:
+        A dict from benchmark name to its best time in milliseconds
+    """
+    scout, demolisher = config["unitInformation"][3]["shorthand"], config["unitInformation"][4]["shorthand"]
+    fresh = lambda: new_state(config, turn)
+    damage_helpers = {
+        "damage_to_scout": lambda game_state, location: game_state.damage_to_scout(location, 0),
+        "damage_to_demolisher": lambda game_state, location: game_state.damage_to_demolisher(location, 0),
+        "damage_dealt_mobile": lambda game_state, location: game_state.damage_dealt_mobile(location, game_state, demolisher, 3),
+        "damage_to_mobile": lambda game_state, location: game_state.damage_to_mobile(location, game_state, scout),
+    }
+    times = {
+        # GameState builds its map on first use, which is counted here as every turn of the strategy uses it
+        "GameState": best_time(lambda: fresh().game_map, repeat=repeat, number=10),
+        "find_path_to_edge": best_time_fresh(fresh, find_all_paths, repeat),
+        "get_target": best_time_fresh(lambda: with_scouts(config, turn), target_all, repeat),
+    }
+    for name, helper in damage_helpers.items():
+        times[name] = best_time_fresh(fresh, damage_from_edges(helper), repeat)
+    # The previous turn's precomputation runs in the background, it is left to finish before timing a turn
+    times["on_turn"] = best_time_fresh(lambda: algo.precomputer is None or algo.precomputer.wait(), lambda _: run_turn(algo, turn), repeat)
+    return {name: round(seconds * 1000, 3) for name, seconds in times.items()}
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baselines_file:
+        return json.load(baselines_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times the gamelib hot paths and compares them with stored baselines")
+    parser.add_argument("--recording", help="Time the turns of a recorded game instead of the generated corpus")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="The baselines file")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown over the baseline reported as a regression")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats of each benchmark, the best is kept")
+    args = parser.parse_args(argv)
+
+    config = GameConfig(load_config())
+    corpus = recorded_corpus(args.recording) if args.recording else generated_corpus(config)
+    algo = make_algo(config)
+    baselines = load_baselines(args.baselines)
+    results = {}
+    regressions = []
+
+    print("{:>10} {:>22} {:>12} {:>14} {:>7}".format("turn", "benchmark", "time (ms)", "baseline (ms)", "ratio"))
+    for turn_name, turn in corpus.items():
+        results[turn_name] = benchmark_turn(config, turn, algo, args.repeat)
+        for name, milliseconds in results[turn_name].items():
+            baseline = baselines.get(turn_name, {}).get(name)
+            if baseline:
+                ratio = milliseconds / baseline
+                flag = "  slower" if ratio > args.threshold else ""
+                if flag:
+                    regressions.append((turn_name, name))
+                print("{:>10} {:>22} {:>12.3f} {:>14.3f} {:>6.2f}x{}".format(turn_name, name, milliseconds, baseline, ratio, flag))
+            else:
+                print("{:>10} {:>22} {:>12.3f} {:>14} {:>7}".format(turn_name, name, milliseconds, "-", "-"))
+
+    if args.save:
+        with open(args.baselines, "w") as baselines_file:
+            json.dump(results, baselines_file, indent=4, sort_keys=True)
+            baselines_file.write("\n")
+        print("Saved baselines to {}".format(args.baselines))
+    elif regressions:
+        sys.exit("{} benchmarks are more than {}x slower than their baseline".format(len(regressions), args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares ArrayPathFinder with the original ShortestPathFinder.
+
+Every unblocked tile on our edges is pathed to its target edge, on boards of increasing density,
+one start at a time with both classes and as a single ArrayPathFinder.navigate_many call per edge.
+The second table times what-if wall placements on every free tile of our half, searching from
+scratch after each placement versus repairing a DynamicPathField and undoing the change.
+"""
+import sys
+
+from gamelib import GameConfig
+from gamelib.navigation import ShortestPathFinder, ArrayPathFinder, DynamicPathField
+
+from .common import load_config, make_board, friendly_edge_starts, best_time
+
+
+def path_all(finder, game_state, starts):
+    for start in starts:
+        target_edge = game_state.get_target_edge(start)
+        end_points = game_state.game_map.get_edge_locations(target_edge)
+        finder.navigate_multiple_endpoints(start, end_points, game_state)
+
+
+def path_all_batched(finder, game_state, starts):
+    by_edge = {}
+    for start in starts:
+        by_edge.setdefault(game_state.get_target_edge(start), []).append(start)
+    finder.load_blocked(game_state)
+    for target_edge, edge_starts in by_edge.items():
+        finder.navigate_many(edge_starts, game_state.game_map.get_edge_locations(target_edge))
+
+
+def placements_from_scratch(engine, game_state, start, candidates):
+    end_points = game_state.game_map.get_edge_locations(game_state.get_target_edge(start))
+    wall = game_state.config["unitInformation"][0]["shorthand"]
+    for location in candidates:
+        game_state.game_map.add_unit(wall, location, 0)
+        engine.navigate_multiple_endpoints(start, end_points, game_state)
+        game_state.game_map.remove_unit(location)
+
+
+def placements_incremental(game_state, start, candidates):
+    field = DynamicPathField(game_state, game_state.get_target_edge(start))
+    for location in candidates:
+        field.block(location)
+        field.find_path(start)
+        field.undo()
+
+
+def main(densities=(0.0, 0.15, 0.3, 0.45)):
+    config = GameConfig(load_config())
+    print("{:>8} {:>7} {:>14} {:>14} {:>8} {:>11} {:>8}".format("density", "starts", "Shortest (ms)", "Array (ms)", "speedup", "Batch (ms)", "speedup"))
+    for density in densities:
+        game_state = make_board(config, density)
+        starts = friendly_edge_starts(game_state)
+        reference, engine = ShortestPathFinder(), ArrayPathFinder()
+        for start in starts:
+            end_points = game_state.game_map.get_edge_locations(game_state.get_target_edge(start))
+            if reference.navigate_multiple_endpoints(start, end_points, game_state) != engine.navigate_multiple_endpoints(start, end_points, game_state):
+                sys.exit("Path mismatch from {} at density {}".format(start, density))
+
+        old = best_time(lambda: path_all(reference, game_state, starts))
+        new = best_time(lambda: path_all(engine, game_state, starts))
+        batch = best_time(lambda: path_all_batched(engine, game_state, starts))
+        print("{:>8.2f} {:>7} {:>14.2f} {:>14.2f} {:>7.1f}x {:>11.2f} {:>7.1f}x".format(
+            density, len(starts), old * 1000, new * 1000, old / new, batch * 1000, old / batch))
+
+    print()
+    print("{:>8} {:>11} {:>14} {:>17} {:>8}".format("density", "candidates", "Scratch (ms)", "Incremental (ms)", "speedup"))
+    for density in densities:
+        game_state = make_board(config, density)
+        start = friendly_edge_starts(game_state)[0]
+        candidates = [location for location in game_state.game_map
+                      if location[1] < game_state.HALF_ARENA and location != start and not game_state.contains_stationary_unit(location)]
+        scratch = best_time(lambda: placements_from_scratch(ArrayPathFinder(), game_state, start, candidates), repeat=3)
+        incremental = best_time(lambda: placements_incremental(game_state, start, candidates), repeat=3)
+        print("{:>8.2f} {:>11} {:>14.2f} {:>17.2f} {:>7.1f}x".format(density, len(candidates), scratch * 1000, incremental * 1000, scratch / incremental))
+
+
+if __name__ == "__main__":
+    main()
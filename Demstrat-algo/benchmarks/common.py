@@ -0,0 +1,68 @@
+import json
+import os
+import random
+import timeit
+
+from gamelib import GameState
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+EMPTY_TURN = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+
+
+def load_config():
+    """Loads the game config dict used by the benchmarks, GameState needs it compiled with GameConfig
+    """
+    with open(CONFIG_PATH) as config_file:
+        return json.load(config_file)
+
+
+def make_board(config, density=0.25, seed=0):
+    """Builds a GameState with structures randomly placed on both halves of the board
+
+    Args:
+        config: The GameConfig
+        density: The fraction of tiles holding a structure
+        seed: Seed for the structure placement, so boards are reproducible
+
+    Returns:
+        A GameState with warnings suppressed
+    """
+    game_state = GameState(config, EMPTY_TURN)
+    game_state.suppress_warnings(True)
+    rng = random.Random(seed)
+    structures = [config["unitInformation"][index]["shorthand"] for index in range(3)]
+    for location in game_state.game_map:
+        if rng.random() < density:
+            player_index = 0 if location[1] < game_state.HALF_ARENA else 1
+            game_state.game_map.add_unit(rng.choice(structures), location, player_index)
+    return game_state
+
+
+def friendly_edge_starts(game_state):
+    """All unblocked tiles on our two edges
+    """
+    game_map = game_state.game_map
+    edges = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+    return [location for location in edges if not game_state.contains_stationary_unit(location)]
+
+
+def best_time(func, repeat=5, number=1):
+    """Best wall time of func in seconds, per call
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def best_time_fresh(setup, func, repeat=5):
+    """Best wall time of func in seconds, called once per repeat on a new object from setup
+
+    For code that caches, so every repeat starts cold. Setup is not timed.
+    """
+    best = None
+    for _ in range(repeat):
+        subject = setup()
+        start = timeit.default_timer()
+        func(subject)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,91 @@
+"""
+Turn messages for the benchmarks, in the format the engine sends them.
+
+The built in corpus is generated from a fixed seed, so it is the same on every machine. Each stage
+of a game is a board density, a share of damaged and upgraded structures and the resources
+players hold by then. Turns recorded from real games with GAMELIB_RECORD can be used instead.
+"""
+import json
+import random
+
+from gamelib import topology
+from gamelib.replay import read_recording, message_kind
+
+# name -> (turn number, structure density, share of damaged structures, share of upgraded structures, SP, MP)
+STAGES = {
+    "early": (3, 0.08, 0.0, 0.0, 12.0, 7.0),
+    "mid": (15, 0.2, 0.2, 0.15, 18.0, 11.0),
+    "late": (40, 0.3, 0.35, 0.35, 25.0, 16.0),
+    "dense": (60, 0.5, 0.35, 0.5, 30.0, 20.0),
+}
+
+
+def make_turn(config, turn, density, damaged=0.0, upgraded=0.0, sp=30.0, mp=5.0, seed=0):
+    """Builds a turn message with structures randomly placed on both halves of the board
+
+    Args:
+        config: The game config
+        turn: The turn number
+        density: The fraction of arena tiles holding a structure
+        damaged: The fraction of structures below full health
+        upgraded: The fraction of structures that are upgraded
+        sp: The SP both players hold
+        mp: The MP both players hold
+        seed: Seed for the placement, so turns are reproducible
+
+    Returns:
+        The turn message as a JSON string
+    """
+    rng = random.Random(seed)
+    unit_information = config["unitInformation"]
+    players = [[[] for _ in unit_information] for _ in range(2)]
+    unit_id = 0
+    for x, y in map(topology.TILE_XY.__getitem__, topology.IN_BOUNDS_TILES):
+        if rng.random() >= density:
+            continue
+        units = players[0 if y < topology.HALF_ARENA else 1]
+        index = rng.randrange(3)
+        health = unit_information[index]["startHealth"]
+        if rng.random() < damaged:
+            health = round(health * rng.uniform(0.1, 0.9), 1)
+        unit_id += 1
+        units[index].append([x, y, float(health), str(unit_id)])
+        if rng.random() < upgraded:
+            units[7].append([x, y, 0.0, str(unit_id)])
+    stats = [40.0, sp, mp, 0]
+    return json.dumps({"p2Units": players[1], "turnInfo": [0, turn, -1], "p1Stats": stats, "p1Units": players[0],
+                       "p2Stats": stats, "events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [],
+                                                    "move": [], "spawn": [], "death": [], "attack": [], "melee": []}})
+
+
+def generated_corpus(config, seed=0):
+    """The built in corpus, one turn for each of STAGES
+
+    Args:
+        config: The game config
+        seed: Seed for the placements
+
+    Returns:
+        A dict from stage name to turn message
+    """
+    return {name: make_turn(config, turn, density, damaged, upgraded, sp, mp, seed)
+            for name, (turn, density, damaged, upgraded, sp, mp) in STAGES.items()}
+
+
+def recorded_corpus(path):
+    """Turns from a game recorded with GAMELIB_RECORD
+
+    Args:
+        path: The recording
+
+    Returns:
+        A dict from "turn N" to the turn message, in game order
+    """
+    corpus = {}
+    for record in read_recording(path):
+        if record["dir"] != "in":
+            continue
+        kind, turn, _ = message_kind(record["line"])
+        if kind == "turn":
+            corpus["turn {}".format(turn)] = record["line"]
+    return corpus
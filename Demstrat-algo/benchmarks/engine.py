@@ -0,0 +1,215 @@
+"""
+A local stand-in for the game engine, for timing whole turns end to end.
+
+It starts the algo with run.sh and speaks the engine's protocol over its stdin and stdout:
+the config line, then canned turn messages each answered by the two command lines from
+submit_turn, optional action frames after each turn, and the end message. It times each
+round trip from sending a turn to reading the second command line, and checks that both
+lines are well formed commands. There are no game rules, the commands do not change the
+turns that follow.
+
+    python3 -m benchmarks.engine                          the generated corpus turns
+    python3 -m benchmarks.engine --recording FILE         the engine messages of a GAMELIB_RECORD recording
+    python3 -m benchmarks.engine --frames 10 --algo PATH  10 action frames a turn, another run script
+
+The exit status is 1 when a turn timed out or got invalid commands.
+"""
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from gamelib import topology
+from gamelib.replay import read_recording, message_kind
+
+from .common import load_config
+from .corpus import generated_corpus
+
+RUN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run.sh")
+
+RoundTrip = namedtuple("RoundTrip", ["turn", "latency", "errors"])
+
+
+def validate_commands(config, build_line, deploy_line):
+    """Checks the two command lines sent for a turn
+
+    The build line may only hold structures, removals and upgrades on our half of the arena,
+    the deploy line only mobile units on our edges.
+
+    Args:
+        config: The game config
+        build_line: The first line sent, without its newline
+        deploy_line: The second line sent, without its newline
+
+    Returns:
+        A list of problems, empty if the commands are valid
+    """
+    shorthands = [unit["shorthand"] for unit in config["unitInformation"]]
+    build_types = set(shorthands[:3] + shorthands[6:8])
+    deploy_types = set(shorthands[3:6])
+    errors = []
+    for name, line, unit_types in (("build", build_line, build_types), ("deploy", deploy_line, deploy_types)):
+        try:
+            commands = json.loads(line)
+        except ValueError:
+            errors.append("{} line is not JSON: {!r}".format(name, line))
+            continue
+        if not isinstance(commands, list):
+            errors.append("{} line is not a list: {!r}".format(name, line))
+            continue
+        for command in commands:
+            if not (isinstance(command, list) and len(command) == 3 and command[0] in unit_types
+                    and all(isinstance(value, int) for value in command[1:])):
+                errors.append("{} line holds an invalid command: {!r}".format(name, command))
+                continue
+            x, y = command[1:]
+            if not topology.in_bounds(x, y):
+                errors.append("{} command is out of the arena: {!r}".format(name, command))
+            elif y >= topology.HALF_ARENA:
+                errors.append("{} command is on the enemy half: {!r}".format(name, command))
+            elif name == "deploy" and not (topology.FRIENDLY_EDGE_MASK[topology.tile_id(x, y)]):
+                errors.append("deploy command is not on our edges: {!r}".format(command))
+    return errors
+
+
+def generated_messages(config, frames=0):
+    """Engine messages for a game over the generated corpus turns
+
+    Args:
+        config: The game config
+        frames: The number of action frames sent after each turn
+
+    Returns:
+        The list of messages, starting with the config and ending with the end message
+    """
+    messages = [json.dumps(config)]
+    for turn_number, turn in enumerate(generated_corpus(config).values()):
+        state = json.loads(turn)
+        state["turnInfo"] = [0, turn_number, -1]
+        messages.append(json.dumps(state))
+        for frame in range(frames):
+            state["turnInfo"] = [1, turn_number, frame]
+            messages.append(json.dumps(state))
+    state["turnInfo"] = [2, turn_number, -1]
+    messages.append(json.dumps(state))
+    return messages
+
+
+def recorded_messages(path):
+    """The engine messages of a game recorded with GAMELIB_RECORD, in order
+    """
+    return [record["line"] for record in read_recording(path) if record["dir"] == "in"]
+
+
+class LocalEngine:
+    """Plays canned engine messages to an algo process and times its turns
+
+    Attributes :
+        * command (list): The command starting the algo
+        * timeout (float): Seconds to wait for a turn's commands, waitTimeBotMax from the config
+
+    """
+    def __init__(self, config, command=None):
+        """Sets up the engine, the algo is started by play
+
+        Args:
+            config: The game config
+            command: The command starting the algo. run.sh next to the benchmarks if None.
+
+        """
+        self.config = config
+        self.command = command or ["bash", RUN_SCRIPT]
+        self.timeout = config.get("timingAndReplay", {}).get("waitTimeBotMax", 35000) / 1000
+
+    def play(self, messages):
+        """Starts the algo and sends it the messages
+
+        Turn messages get p1Stats[3] set to the time the algo took on the previous turn,
+        in milliseconds, as the engine does.
+
+        Args:
+            messages: Engine messages, see generated_messages
+
+        Returns:
+            A RoundTrip for each turn, latency is None if the algo did not answer in time
+        """
+        process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        lines = queue.Queue()
+        threading.Thread(target=self.__read_lines, args=(process.stdout, lines), daemon=True).start()
+        round_trips = []
+        previous_ms = 0
+        try:
+            for message in messages:
+                kind, turn_number, _ = message_kind(message)
+                if kind == "turn":
+                    state = json.loads(message)
+                    state["p1Stats"][3] = previous_ms
+                    message = json.dumps(state)
+                start = time.perf_counter()
+                process.stdin.write(message + "\n")
+                process.stdin.flush()
+                if kind != "turn":
+                    continue
+                answer = self.__read_answer(lines, start + self.timeout)
+                if answer is None:
+                    round_trips.append(RoundTrip(turn_number, None, ["no commands within {}s".format(self.timeout)]))
+                    break
+                latency = time.perf_counter() - start
+                previous_ms = round(latency * 1000)
+                round_trips.append(RoundTrip(turn_number, latency, validate_commands(self.config, *answer)))
+            process.stdin.close()
+            process.wait(timeout=self.timeout)
+        finally:
+            if process.poll() is None:
+                process.kill()
+        return round_trips
+
+    @staticmethod
+    def __read_lines(stream, lines):
+        for line in stream:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+
+    @staticmethod
+    def __read_answer(lines, deadline):
+        answer = []
+        while len(answer) < 2:
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                return None
+            if line is None:
+                return None
+            answer.append(line)
+        return answer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plays canned turns to an algo over stdin and stdout and times each turn")
+    parser.add_argument("--recording", help="Send the engine messages of a recorded game instead of the generated corpus")
+    parser.add_argument("--frames", type=int, default=0, help="Action frames sent after each generated turn")
+    parser.add_argument("--algo", default=RUN_SCRIPT, help="The run script of the algo")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    messages = recorded_messages(args.recording) if args.recording else generated_messages(config, args.frames)
+    round_trips = LocalEngine(config, ["bash", args.algo]).play(messages)
+
+    print("{:>6} {:>14}  {}".format("turn", "latency (ms)", "problems"))
+    for round_trip in round_trips:
+        latency = "-" if round_trip.latency is None else "{:.3f}".format(round_trip.latency * 1000)
+        print("{:>6} {:>14}  {}".format(round_trip.turn, latency, "; ".join(round_trip.errors)))
+    latencies = [round_trip.latency for round_trip in round_trips if round_trip.latency is not None]
+    if latencies:
+        print("mean {:.3f} ms, max {:.3f} ms over {} turns".format(sum(latencies) * 1000 / len(latencies), max(latencies) * 1000, len(latencies)))
+    if any(round_trip.errors for round_trip in round_trips):
+        sys.exit("Some turns timed out or sent invalid commands")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,26 +4,55 @@ The gamelib package contains modules that assist in algo creation \n
 The GameState class in game_state.py is the main class most players interact with. 
 It contains functions that let you get information about resources, deploy units, and help you strategize your move. \n
 
+The GameConfig class in game_config.py compiles the config sent by the engine once, into the unit types, stats, costs and
+resource schedule that GameState, GameMap and GameUnit use. AlgoCore builds it once and passes it to on_game_start, pass it on to them. \n
+
 The GameMap class in game_map.py represents the current game map. It can be used to access information related to the locations of units. 
 Investigating it is useful for any player that wants to access more information about the current state of the game. \n
 
 The GameUnit class in unit.py represetns a single unit. 
 Investigating it is useful for any player that wants to access information about units. \n
 
+The UnitStore class in unit_store.py holds the units of a GameMap as parallel arrays, game_map[x, y] gives views of them. \n
+
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
+The events module in events.py reads the events of action frames without decoding their units, for AlgoCore.subscribe. \n
+
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The PlanEvaluator class in planner.py simulates candidate attack plans in a pool of worker processes and picks the best one before a deadline. \n
+
+The Precomputer class in precompute.py prepares paths, threat grids and other work for the next turn in a background thread during the action phase, when GAMELIB_PRECOMPUTE is set. \n
+
+The profiling module in profiling.py times the hot paths of gamelib each turn when the GAMELIB_PROFILE environment variable is set. \n
+
+The replay module in replay.py records the lines exchanged with the engine when GAMELIB_RECORD is set, and replays recorded games into an algo offline to time each message. \n
+
+The TurnScheduler class in scheduler.py runs strategy stages against the turn's time limit and always submits the best turn found in time. \n
+
+The ActionSimulator class in simulator.py steps the action phase frame by frame on a fork of a GameState, for evaluating attacks before sending them. \n
+
+The ThreatGrid and AttackerIndex classes in threat.py hold the damage per frame and the attacking structures for each tile, used by GameState to score paths. \n
+
+The topology module in topology.py holds tables describing the board, tile ids, bounds, neighbors, edges and mirrors, built once at import. 
+GameMap, GameState and the pathfinders use them instead of redoing the board geometry. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
 from .algocore import AlgoCore
 from .util import debug_write
+from .game_config import GameConfig
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .planner import PlanEvaluator
+from .precompute import Precomputer
+from .scheduler import TurnScheduler
+from . import topology
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "events", "game_config", "game_state", "game_map", "navigation", "planner", "precompute", "profiling", "replay", "scheduler", "simulator", "threat", "topology", "unit", "unit_store", "util"]
  
\ No newline at end of file
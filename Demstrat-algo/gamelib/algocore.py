@@ -1,7 +1,10 @@
-import json
+import time
 
+from .events import turn_info, frame_events, make_events
+from .game_config import GameConfig
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .replay import start_recording
+from .util import get_command, debug_write, BANNER_TEXT, send_command, json_loads
 
 class AlgoCore(object):
     """
@@ -9,16 +12,19 @@ class AlgoCore(object):
     algo_strategy.py subclasses it. 
 
     Attributes :
-        * config (JSON): json object containing information about the game
+        * config (GameConfig): information about the game, compiled from the config sent by the engine
+        * turn_start (float): When the message for the current turn or frame was received, as given by time.time()
 
     """
     def __init__(self):
         self.config = None
+        self.turn_start = None
+        self._event_handlers = {}
 
     def on_game_start(self, config):
         """
-        This function is called once at the start of the game. 
-        By default, it just initializes the config. \n
+        This function is called once at the start of the game, with the config sent by the engine compiled into a GameConfig. 
+        By default, it just keeps the config. \n
         You can override it it in algo_strategy.py to perform start of game setup
         """
         self.config = config
@@ -26,7 +32,7 @@ class AlgoCore(object):
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
-        It is passed the current game state, which can be used to initiate a new GameState object. 
+        It is passed the current game state, already decoded from JSON, which can be used to initiate a new GameState object. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -38,11 +44,34 @@ class AlgoCore(object):
         """
         After each deploy phase, the game engine will run the action phase of the round.
         The action phase is made up of a sequence of distinct frames. 
-        Each of these frames is sent to the algo in order. 
+        Each of these frames is sent to the algo in order, already decoded from JSON. 
         They can be handled in this function. 
+        When it is not overridden, frames are not decoded at all, apart from the events needed by subscribe handlers.
         """
         pass
 
+    def subscribe(self, event_kind, handler):
+        """
+        Calls handler with each event of a kind in the action frames, for example "breach", "death", "damage" or "spawn".
+        Handlers get the events as tuples, see events.py. 
+        If on_action_frame is not overridden, only the events section of each frame is decoded, 
+        which is much cheaper than decoding the whole frame.
+
+        Args:
+            event_kind: A key of the events in action frames
+            handler: A function taking one event
+        """
+        self._event_handlers.setdefault(event_kind, []).append(handler)
+
+    def __dispatch_events(self, events):
+        for event_kind, handlers in self._event_handlers.items():
+            raw_events = events.get(event_kind)
+            if not raw_events:
+                continue
+            for event in make_events(event_kind, raw_events):
+                for handler in handlers:
+                    handler(event)
+
 
     def start(self):
         """ 
@@ -52,31 +81,42 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        wants_frames = type(self).on_action_frame is not AlgoCore.on_action_frame
+        # Tees the protocol to a file when GAMELIB_RECORD is set, see replay.py
+        start_recording()
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
             game_state_string = get_command()
+            self.turn_start = time.time()
             if "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
+                parsed_config = json_loads(game_state_string)
+                self.on_game_start(GameConfig(parsed_config))
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+                # Only turnInfo is read here, each message is then decoded at most once and the decoded state is passed on
+                info = turn_info(game_state_string) or json_loads(game_state_string).get("turnInfo")
+                stateType = int(info[0])
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
+                    self.on_turn(json_loads(game_state_string))
                 elif stateType == 1:
                     """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
+                    If stateType == 1, this state represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    if wants_frames:
+                        state = json_loads(game_state_string)
+                        self.on_action_frame(state)
+                        if self._event_handlers:
+                            self.__dispatch_events(state.get("events", {}))
+                    elif self._event_handlers:
+                        self.__dispatch_events(frame_events(game_state_string))
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
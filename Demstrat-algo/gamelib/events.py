@@ -0,0 +1,79 @@
+"""
+Cheap reads of action frame messages, for strategies that only follow the frame events.
+
+An action frame holds every unit of both players, but a strategy watching for breaches only
+needs the small events section. turn_info and frame_events find their key in the message and
+decode just that value, the rest of the frame is never decoded. AlgoCore.subscribe builds on them.
+
+Events of the kinds below are given as named tuples, other kinds as plain tuples in the order
+the engine sends them. In events, player is 1 for you and 2 for the enemy, and unit_type is
+the index of the unit in the config's unitInformation.
+"""
+import json
+import re
+from collections import namedtuple
+
+BreachEvent = namedtuple("BreachEvent", ["location", "damage", "unit_type", "unit_id", "player"])
+DamageEvent = namedtuple("DamageEvent", ["location", "damage", "unit_type", "unit_id", "player"])
+DeathEvent = namedtuple("DeathEvent", ["location", "unit_type", "unit_id", "player", "removed_by_owner"])
+SpawnEvent = namedtuple("SpawnEvent", ["location", "unit_type", "unit_id", "player"])
+
+EVENT_TYPES = {
+    "breach": BreachEvent,
+    "damage": DamageEvent,
+    "death": DeathEvent,
+    "spawn": SpawnEvent,
+}
+
+_decoder = json.JSONDecoder()
+_TURN_INFO_KEY = re.compile(r'"turnInfo"\s*:\s*')
+_EVENTS_KEY = re.compile(r'"events"\s*:\s*')
+
+
+def _decode_value(message, key_pattern):
+    match = key_pattern.search(message)
+    if match is None:
+        return None
+    return _decoder.raw_decode(message, match.end())[0]
+
+
+def turn_info(message):
+    """Reads the turnInfo of an engine message without decoding the rest
+
+    Args:
+        message: The message as sent by the engine
+
+    Returns:
+        The turnInfo list, [message type, turn, frame], or None if the message has none
+    """
+    return _decode_value(message, _TURN_INFO_KEY)
+
+
+def frame_events(message):
+    """Reads the events of an action frame without decoding the rest
+
+    Args:
+        message: The action frame as sent by the engine
+
+    Returns:
+        A dict from event kind to the list of events, empty if the message has no events
+    """
+    return _decode_value(message, _EVENTS_KEY) or {}
+
+
+def make_events(kind, raw_events):
+    """Turns the events of one kind, as decoded from a frame, into tuples
+
+    Args:
+        kind: The event kind, a key of the frame's events
+        raw_events: The list of events of that kind
+
+    Returns:
+        A list of named tuples for the kinds in EVENT_TYPES, plain tuples otherwise. Fields the
+        named tuples do not know are left out.
+    """
+    event_type = EVENT_TYPES.get(kind)
+    if event_type is None:
+        return [tuple(event) for event in raw_events]
+    size = len(event_type._fields)
+    return [event_type._make(event[:size]) for event in raw_events]
@@ -0,0 +1,142 @@
+from collections import namedtuple
+from collections.abc import Mapping
+
+UnitStats = namedtuple("UnitStats", ["stationary", "speed", "damage_f", "damage_i", "attackRange", "shieldRange",
+                                     "max_health", "shieldPerUnit", "cost", "upgraded"])
+UnitStats.__doc__ = """The stats shared by all units of a type, upgraded or not. See GameUnit for the fields, cost is a (SP, MP) tuple."""
+
+
+def check_config(config):
+    """Checks that a config was compiled, GameState, GameMap, GameUnit and UnitStore do not take the config dict
+
+    Args:
+        config: The config they were given
+
+    Returns:
+        The GameConfig
+
+    Raises:
+        TypeError: If config is not a GameConfig
+    """
+    if not isinstance(config, GameConfig):
+        raise TypeError("Expected a GameConfig, got {}. Compile the config sent by the engine once with GameConfig(config)".format(type(config).__name__))
+    return config
+
+
+def _build_stats(unit_information):
+    stats = {}
+    for type_config in unit_information:
+        if "shorthand" not in type_config:
+            continue
+        base = UnitStats(
+            stationary=type_config.get("unitCategory") == 0,
+            speed=type_config.get("speed", 0),
+            damage_f=type_config.get("attackDamageTower", 0),
+            damage_i=type_config.get("attackDamageWalker", 0),
+            attackRange=type_config.get("attackRange", 0),
+            shieldRange=type_config.get("shieldRange", 0),
+            max_health=type_config.get("startHealth", 0),
+            shieldPerUnit=type_config.get("shieldPerUnit", 0),
+            cost=(type_config.get("cost1", 0), type_config.get("cost2", 0)),
+            upgraded=False)
+        upgrade = type_config.get("upgrade", {})
+        stats[type_config["shorthand"], False] = base
+        stats[type_config["shorthand"], True] = base._replace(
+            speed=upgrade.get("speed", base.speed),
+            damage_f=upgrade.get("attackDamageTower", base.damage_f),
+            damage_i=upgrade.get("attackDamageWalker", base.damage_i),
+            attackRange=upgrade.get("attackRange", base.attackRange),
+            shieldRange=upgrade.get("shieldRange", base.shieldRange),
+            max_health=upgrade.get("startHealth", base.max_health),
+            shieldPerUnit=upgrade.get("shieldPerUnit", base.shieldPerUnit),
+            cost=(upgrade.get("cost1", 0) + base.cost[0], upgrade.get("cost2", 0) + base.cost[1]),
+            upgraded=True)
+    return stats
+
+
+class GameConfig(Mapping):
+    """The game config with everything gamelib derives from it worked out once
+
+    AlgoCore builds it once and passes it to on_game_start. GameState, GameMap and GameUnit
+    take it instead of the config dict. It can not be changed, so game states of different
+    threads or plans can share it.
+
+    It reads like the config dict it was built from, config["unitInformation"] still works.
+
+    Attributes :
+        * raw (dict): The config dict sent by the engine
+        * WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR (str): The shorthands of the unit types
+        * REMOVE (str): The shorthand for removing your own unit
+        * UPGRADE (str): The shorthand for upgrading a unit
+        * UNIT_TYPE_TO_INDEX (dict): Maps a shorthand to its type id, the index of the type in unitInformation
+        * unit_types (tuple): The shorthand of each type id
+        * ALL_UNITS (tuple): The units that can be spawned
+        * STRUCTURE_TYPES (tuple): The structure units
+        * MP (int): A constant representing the Mobile Points resource
+        * SP (int): A constant representing the Structure Points resource
+        * stats (dict): The UnitStats of each (shorthand, upgraded) pair
+        * costs (dict): The (SP, MP) cost of spawning each unit type
+        * upgrade_costs (dict): The (SP, MP) cost of upgrading each unit type that can be upgraded
+        * hit_radius (float): How far from a tile's center units on it can be hit
+        * mp_decay (float): The share of MP lost at the start of each turn
+        * mp_per_round (float): The MP gained each turn, before growth
+        * mp_growth (float): The growth of the MP gained per turn, every mp_growth_interval turns
+        * mp_growth_interval (int): The number of turns between each growth of the MP gained
+
+    """
+    def __init__(self, config):
+        """Compiles a config
+
+        Args:
+            config: The config dict sent by the engine
+
+        """
+        unit_information = config["unitInformation"]
+        shorthands = tuple(info.get("shorthand") for info in unit_information)
+        values = dict(zip(("WALL", "SUPPORT", "TURRET", "SCOUT", "DEMOLISHER", "INTERCEPTOR", "REMOVE", "UPGRADE"), shorthands))
+        stats = _build_stats(unit_information)
+        resources = config.get("resources", {})
+        values.update(
+            raw=config,
+            unit_types=shorthands,
+            UNIT_TYPE_TO_INDEX={unit_type: type_id for type_id, unit_type in enumerate(shorthands) if unit_type},
+            ALL_UNITS=shorthands[3:6] + shorthands[:3],
+            STRUCTURE_TYPES=shorthands[:3],
+            MP=1,
+            SP=0,
+            stats=stats,
+            costs={info["shorthand"]: (info.get("cost1", 0), info.get("cost2", 0)) for info in unit_information if "shorthand" in info},
+            upgrade_costs={info["shorthand"]: (info["upgrade"].get("cost1", info.get("cost1", 0)), info["upgrade"].get("cost2", info.get("cost2", 0)))
+                           for info in unit_information if "shorthand" in info and info.get("upgrade") is not None},
+            hit_radius=unit_information[0].get("getHitRadius", 0),
+            mp_decay=resources.get("bitDecayPerRound"),
+            mp_per_round=resources.get("bitsPerRound"),
+            mp_growth_interval=resources.get("turnIntervalForBitSchedule"),
+            mp_growth=resources.get("bitGrowthRate"),
+        )
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameConfig can not be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("GameConfig can not be changed")
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def is_stationary(self, unit_type):
+        """
+            Args:
+                unit_type: A unit type
+
+            Returns:
+                Boolean, True if the unit is stationary, False otherwise.
+        """
+        return unit_type in self.STRUCTURE_TYPES
@@ -1,6 +1,60 @@
 import math
-from .unit import GameUnit
+from array import array
+from itertools import compress
+from .game_config import check_config
+from .unit_store import UnitStore, StoredUnit
 from .util import debug_write
+from .profiling import timed
+from .topology import in_bounds, disc_tiles, IN_BOUNDS_TILES, TILE_X, TILE_Y, EDGE_LOCATIONS
+
+
+class TileUnits(list):
+    """The list of units game_map[x, y] gives
+
+    Units added to or removed from it are added to or removed from the map, as if the whole
+    list was assigned with game_map[x, y] = units. An added unit is copied into the map's unit
+    store and replaced in the list by a view of the copy, so find units through the list again
+    rather than keeping the object that was added.
+
+    """
+    __slots__ = ("_game_map", "_tile")
+
+    def __changed(self, result):
+        self._game_map._sync_tile(self._tile)
+        return result
+
+    def append(self, unit):
+        return self.__changed(list.append(self, unit))
+
+    def extend(self, units):
+        return self.__changed(list.extend(self, units))
+
+    def insert(self, index, unit):
+        return self.__changed(list.insert(self, index, unit))
+
+    def remove(self, unit):
+        return self.__changed(list.remove(self, unit))
+
+    def pop(self, index=-1):
+        return self.__changed(list.pop(self, index))
+
+    def clear(self):
+        return self.__changed(list.clear(self))
+
+    def __setitem__(self, index, value):
+        return self.__changed(list.__setitem__(self, index, value))
+
+    def __delitem__(self, index):
+        return self.__changed(list.__delitem__(self, index))
+
+    def __iadd__(self, units):
+        list.__iadd__(self, units)
+        return self.__changed(self)
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        return self.__changed(self)
+
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -9,8 +63,12 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    The units are kept in a UnitStore, and the Units given by game_map[x, y] are views
+    of it, so changes to their health, removal mark or upgrade are seen by find_units.
+    Units appended to or removed from the list are added to or removed from the map, see TileUnits.
+
     Attributes :
-        * config (JSON): Contains information about the current game rules
+        * config (GameConfig): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
         * ARENA_SIZE (int): The size of the arena.
         * HALF_ARENA (int): Half of the size of the arena.
@@ -24,10 +82,10 @@ class GameMap:
         """Initializes constants and game map
 
         Args:
-            config (JSON): Contains information about the game
+            config (GameConfig): Contains information about the game
 
         """
-        self.config = config
+        self.config = check_config(config)
         self.enable_warnings = True
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
@@ -35,45 +93,159 @@ class GameMap:
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
-        self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self._store = UnitStore(self.config)
+        self.__tile_slots = [()] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__views = [None] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self._structure_slots = array('i', [-1]) * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__iter_index = 0
+        self.__structure_mask = 0
+        structure_types = [unit_type for unit_type in self.config.unit_types if unit_type and self.config.stats[unit_type, False].stationary]
+        self.__bitboards = [dict.fromkeys(structure_types, 0), dict.fromkeys(structure_types, 0)]
+        self.__hit_radius = self.config.hit_radius
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
-            return self.__map[x][y]
+            return self._units_at(y * self.ARENA_SIZE + x)
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            x, y = location
+            tile = y * self.ARENA_SIZE + x
+            self.__kill(tile)
+            type_ids = self._store.type_ids
+            self.__tile_slots[tile] = tuple(self._store.add(type_ids[unit.unit_type], unit.player_index, unit.health, x, y, unit.upgraded, unit.pending_removal)
+                                            for unit in val)
+            self.__update_structure_mask(x, y)
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
+        self.__iter_index = 0
         return self
     
     def __next__(self):
-        location = self.__start
-        if location == [15,27]:
+        if self.__iter_index >= len(IN_BOUNDS_TILES):
             raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
+        tile = IN_BOUNDS_TILES[self.__iter_index]
+        self.__iter_index += 1
+        return [TILE_X[tile], TILE_Y[tile]]
+
+    @property
+    def _structure_changes(self):
+        # Kept by the store, so upgrades made through the GameUnits of the map are counted too
+        return self._store.structure_changes
+
+    def _units_at(self, tile):
+        # The GameUnits of a tile are views of its slots in the store, made the first time the tile is looked at
+        units = self.__views[tile]
+        if units is None:
+            store = self._store
+            units = self.__views[tile] = TileUnits([StoredUnit(store, slot) for slot in self.__tile_slots[tile]])
+            units._game_map = self
+            units._tile = tile
+        return units
+
+    def _sync_tile(self, tile):
+        """Brings the store up to date with the list of units of a tile after it was changed, see TileUnits
+
+        Args:
+            tile: A tile id, y * ARENA_SIZE + x
+        """
+        units = self.__views[tile]
+        store = self._store
+        old_slots = self.__tile_slots[tile]
+        x, y = TILE_X[tile], TILE_Y[tile]
+        slots = []
+        for index, unit in enumerate(units):
+            if isinstance(unit, StoredUnit) and unit._store is store and unit._slot in old_slots and unit._slot not in slots:
+                slots.append(unit._slot)
             else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
-
-    def __empty_grid(self):
-        grid = []
-        for x in range(0, self.ARENA_SIZE):
-            grid.append([])
-            for _ in range(0, self.ARENA_SIZE):
-                grid[x].append([])
-        return grid
+                slot = store.add(store.type_ids[unit.unit_type], unit.player_index, unit.health, x, y, unit.upgraded, unit.pending_removal)
+                list.__setitem__(units, index, StoredUnit(store, slot))
+                slots.append(slot)
+        for slot in old_slots:
+            if slot not in slots:
+                store.kill(slot)
+        self.__tile_slots[tile] = tuple(slots)
+        self.__update_structure_mask(x, y)
+
+    def _tile_slots(self, tile):
+        """Gets the store slots of the units on a tile, see UnitStore
+
+        Args:
+            tile: A tile id, y * ARENA_SIZE + x
+
+        Returns:
+            A tuple of slots, in the order the units were added
+        """
+        return self.__tile_slots[tile]
+
+    def __kill(self, tile):
+        for slot in self.__tile_slots[tile]:
+            self._store.kill(slot)
+        self.__tile_slots[tile] = ()
+        self.__views[tile] = None
+
+    def fork(self):
+        """Makes a copy of this map that can be changed without affecting the original, or the other way around
+
+        The unit store is copied column by column, leaving out removed units, and the GameUnits of
+        the copy are made when its locations are first looked at, which makes forking cheap enough
+        to build many hypothetical boards per turn, unlike copy.deepcopy.
+
+        Returns:
+            A new GameMap with the same units as this one
+        """
+        clone = GameMap.__new__(GameMap)
+        clone.__dict__.update(self.__dict__)
+        store = self._store
+        clone._store = store.copy()
+        if len(clone._store) == len(store):
+            clone.__tile_slots = list(self.__tile_slots)
+            clone._structure_slots = array('i', self._structure_slots)
+        else:
+            # The copy left out dead slots, so the live ones moved down
+            new_slot = store.slot_map().__getitem__
+            tile_slots = clone.__tile_slots = list(self.__tile_slots)
+            structure_slots = clone._structure_slots = array('i', self._structure_slots)
+            for tile in compress(range(len(tile_slots)), tile_slots):
+                tile_slots[tile] = tuple(map(new_slot, tile_slots[tile]))
+                structure_slots[tile] = new_slot(structure_slots[tile])
+        clone.__views = [None] * len(self.__views)
+        clone.__iter_index = 0
+        clone.__bitboards = [dict(boards) for boards in self.__bitboards]
+        return clone
+
+    def __update_structure_mask(self, x, y):
+        tile = y * self.ARENA_SIZE + x
+        self.__clear_structures(tile)
+        for slot in self.__tile_slots[tile]:
+            if self._store.is_stationary(slot):
+                self.__mark_structure(slot, tile)
+
+    def __mark_structure(self, slot, tile):
+        self._store.structure_changes += 1
+        self._structure_slots[tile] = slot
+        bit = 1 << tile
+        self.__structure_mask |= bit
+        player_index = self._store.owner[slot]
+        if player_index == 0 or player_index == 1:
+            boards = self.__bitboards[player_index]
+            unit_type = self._store.unit_types[self._store.type_id[slot]]
+            boards[unit_type] = boards.get(unit_type, 0) | bit
+
+    def __clear_structures(self, tile):
+        self._store.structure_changes += 1
+        self._structure_slots[tile] = -1
+        bit = 1 << tile
+        if self.__structure_mask & bit:
+            self.__structure_mask &= ~bit
+            for boards in self.__bitboards:
+                for unit_type, board in boards.items():
+                    if board & bit:
+                        boards[unit_type] = board & ~bit
 
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
@@ -89,19 +261,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return in_bounds(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -127,27 +287,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in EDGE_LOCATIONS]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -163,15 +303,122 @@ class GameMap:
         """
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
+            return
         if player_index < 0 or player_index > 1:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
-        if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+        self._place(self._store.type_ids[unit_type], player_index, None, x, y)
+
+    def _place(self, type_id, player_index, health, x, y):
+        """Adds a unit to the store and the units at its location. Used by add_unit and by GameState when parsing a turn.
+
+        A structure replaces the units at its location, a mobile unit joins them.
+
+        Args:
+            type_id: The index of the unit's type in the config's unitInformation
+            player_index: The player controlling the unit
+            health: The unit's health, its type's start health if None
+            x: The x coordinate of the unit, inside the arena
+            y: The y coordinate of the unit, inside the arena
+
+        Returns:
+            The slot of the new unit
+        """
+        tile = y * self.ARENA_SIZE + x
+        slot = self._store.add(type_id, player_index, health, x, y)
+        if self._store.is_stationary(slot):
+            self.__kill(tile)
+            self.__tile_slots[tile] = (slot,)
+            self.__clear_structures(tile)
+            self.__mark_structure(slot, tile)
         else:
-            self.__map[x][y] = [new_unit]
+            self.__tile_slots[tile] += (slot,)
+            if self.__views[tile] is not None:
+                list.append(self.__views[tile], StoredUnit(self._store, slot))
+        return slot
+
+    def _place_group(self, type_id, player_index, units):
+        """Adds the units of one type and player as sent by the engine in p1Units or p2Units. Used by GameState when parsing a turn.
+
+        The coordinates and health are collected in one pass and added to the store in bulk,
+        then the tile index is filled unit by unit. No GameUnits are made until the tiles are looked at.
+
+        Args:
+            type_id: The index of the units' type in the config's unitInformation
+            player_index: The player controlling the units
+            units: A list of [x, y, health, ...] entries, inside the arena
+        """
+        if not units:
+            return
+        tile_slots = self.__tile_slots
+        store = self._store
+        xs = array('b')
+        ys = array('b')
+        healths = array('d')
+        tiles = []
+        occupied = False
+        for entry in units:
+            x, y = int(entry[0]), int(entry[1])
+            tile = y * self.ARENA_SIZE + x
+            xs.append(x)
+            ys.append(y)
+            healths.append(float(entry[2]))
+            tiles.append(tile)
+            if tile_slots[tile]:
+                occupied = True
+        stationary = store._stationary[type_id]
+        if stationary and (occupied or len(set(tiles)) < len(tiles)):
+            # Structures on occupied tiles are added one by one, so they replace what is there
+            for x, y, health in zip(xs, ys, healths):
+                self._place(type_id, player_index, health, x, y)
+            return
+        slot = store.extend(type_id, player_index, xs, ys, healths)
+        views = self.__views
+        if stationary:
+            structure_slots = self._structure_slots
+            bits = 0
+            for tile in tiles:
+                tile_slots[tile] = (slot,)
+                structure_slots[tile] = slot
+                views[tile] = None
+                bits |= 1 << tile
+                slot += 1
+            self.__structure_mask |= bits
+            store.structure_changes += 1
+            if player_index == 0 or player_index == 1:
+                boards = self.__bitboards[player_index]
+                unit_type = store.unit_types[type_id]
+                boards[unit_type] = boards.get(unit_type, 0) | bits
+        else:
+            for tile in tiles:
+                tile_slots[tile] += (slot,)
+                views[tile] = None
+                slot += 1
+
+    def _flag_structures(self, units, column):
+        """Sets a flag column of the store for the structures at the given locations. Used by GameState for removals and upgrades.
+
+        Args:
+            units: A list of [x, y, ...] entries
+            column: The column to set, UnitStore.pending_removal or UnitStore.upgraded
+        """
+        structure_slots = self._structure_slots
+        for entry in units:
+            slot = structure_slots[int(entry[1]) * self.ARENA_SIZE + int(entry[0])]
+            if slot >= 0:
+                column[slot] = 1
+        self._store.structure_changes += 1
+
+    def _place_unit(self, unit):
+        """Adds a copy of an existing GameUnit at its location, see _place
+
+        Args:
+            unit: A GameUnit whose x and y are inside the arena
+        """
+        slot = self._place(self._store.type_ids[unit.unit_type], unit.player_index, unit.health, unit.x, unit.y)
+        self._store.upgraded[slot] = 1 if unit.upgraded else 0
+        self._store.pending_removal[slot] = 1 if unit.pending_removal else 0
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -184,10 +431,95 @@ class GameMap:
         """
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
-        
+            return
+
         x, y = location
-        self.__map[x][y] = []
+        tile = y * self.ARENA_SIZE + x
+        self.__kill(tile)
+        self.__clear_structures(tile)
 
+    def find_units(self, player_index=None, unit_type=None, stationary=None, upgraded=None, pending_removal=None, below_health=None):
+        """Finds the locations of the units matching all the given filters, scanning the unit store instead of every tile
+
+        Args:
+            player_index: Only units of this player, 0 for you 1 for the enemy
+            unit_type: Only units of this type
+            stationary: Only structures if True, only mobile units if False
+            upgraded: Only upgraded units if True, only units that are not if False
+            pending_removal: Only units marked for removal if True, only units that are not if False
+            below_health: Only units with less health than this
+
+        Returns:
+            A list of [x, y] locations, once per matching unit, in the order the units were added
+        """
+        store = self._store
+        xs, ys = store.x, store.y
+        return [[xs[slot], ys[slot]] for slot in store.select(player_index, unit_type, stationary, upgraded, pending_removal, below_health)]
+
+    def get_structure_fingerprint(self):
+        """Gets a fingerprint of which tiles hold structures
+
+        The fingerprint is an int with bit (y * ARENA_SIZE + x) set for every blocked location.
+        It is kept up to date by add_unit, remove_unit, game_map[x, y] = units, changes to the
+        lists returned by game_map[x, y] and turn parsing.
+
+        Returns:
+            An int that is equal for two maps exactly when the same tiles hold structures
+        """
+        return self.__structure_mask
+
+    def is_blocked(self, location):
+        """Checks if a location holds a structure, without looking at the units there
+
+        Args:
+            location: A map location
+
+        Returns:
+            True if there is a structure at the location, False otherwise or if the location is out of bounds
+        """
+        x, y = location
+        if not in_bounds(x, y):
+            return False
+        return (self.__structure_mask >> (int(y) * self.ARENA_SIZE + int(x))) & 1 == 1
+
+    def get_structure_mask(self, player_index=None, unit_type=None):
+        """Gets the tiles holding structures as a bitboard
+
+        Bit (y * ARENA_SIZE + x) is set for every matching location. Combine masks with &, | and ~,
+        and see topology.locations_mask and topology.mask_tiles to convert to and from locations.
+
+        Args:
+            player_index: Only include structures of this player, 0 for you 1 for the enemy. Both if None.
+            unit_type: Only include structures of this type. All structure types if None.
+
+        Returns:
+            An int bitboard of the matching tiles
+        """
+        if player_index is None and unit_type is None:
+            return self.__structure_mask
+        players = self.__bitboards if player_index is None else [self.__bitboards[player_index]]
+        mask = 0
+        for boards in players:
+            if unit_type is None:
+                for board in boards.values():
+                    mask |= board
+            else:
+                mask |= boards.get(unit_type, 0)
+        return mask
+
+    def count_structures(self, player_index=None, unit_type=None):
+        """Counts structures, see get_structure_mask
+
+        Args:
+            player_index: Only count structures of this player, 0 for you 1 for the enemy. Both if None.
+            unit_type: Only count structures of this type. All structure types if None.
+
+        Returns:
+            The number of matching structures
+        """
+        return bin(self.get_structure_mask(player_index, unit_type)).count("1")
+
+    @timed("GameMap.get_locations_in_range")
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
 
@@ -201,21 +533,37 @@ class GameMap:
         """
         if radius < 0 or radius > self.ARENA_SIZE:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+        x, y = location
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
+        elif x == int(x) and y == int(y):
+            return [[TILE_X[tile], TILE_Y[tile]] for tile in disc_tiles(int(y) * self.ARENA_SIZE + int(x), radius, self.__hit_radius)]
 
-        x, y = location
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
+                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + self.__hit_radius:
                     locations.append(new_location)
         return locations
 
+    def get_tiles_in_range(self, location, radius):
+        """Gets the tile ids in a circular area around a location, see get_locations_in_range
+
+        Unlike get_locations_in_range this does not allocate, the tuple returned is shared and must not be modified.
+
+        Args:
+            location: The center of our search area, an in bounds location
+            radius: The radius of our search area
+
+        Returns:
+            A tuple of the tile ids (y * ARENA_SIZE + x) that are within our search area
+
+        """
+        return disc_tiles(int(location[1]) * self.ARENA_SIZE + int(location[0]), radius, self.__hit_radius)
+
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
 
@@ -1,109 +1,119 @@
 import math
 import json
 import sys
+import time
 
-from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .navigation import ArrayPathFinder, PathCache, DynamicPathField
+from .util import send_command, debug_write, json_loads
 from .unit import GameUnit
+from .game_config import check_config
 from .game_map import GameMap
-
-def is_stationary(unit_type):
-    """
-        Args:
-            unit_type: A unit type
-        
-        Returns: 
-            Boolean, True if the unit is stationary, False otherwise.
-    """
-    return unit_type in STRUCTURE_TYPES
+from .threat import ThreatGrid, AttackerIndex
+from .simulator import ActionSimulator
+from .profiling import timed, end_turn
+from .topology import tile_id, EDGE_LOCATIONS, FRIENDLY_EDGE_MASK
 
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
 
     Attributes :
-        * UNIT_TYPE_TO_INDEX (dict): Maps a unit to a corresponding index
-        * WALL (str): A constant representing the wall unit
-        * SUPPORT (str): A constant representing the support unit
-        * TURRET (str): A constant representing the turret unit
-        * SCOUT (str): A constant representing the scout unit
-        * DEMOLISHER (str): A constant representing the demolisher unit
-        * INTERCEPTOR (str): A constant representing the interceptor unit
-        * REMOVE (str): A constant representing removing your own unit
-        * UPGRADE (str): A constant representing upgrading a unit
-        * STRUCTURE_TYPES (list): A list of the structure units
+        * config (:obj: GameConfig): The compiled game config. It holds the unit type constants WALL, SUPPORT, TURRET,
+          SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE and UPGRADE, STRUCTURE_TYPES and UNIT_TYPE_TO_INDEX
 
         * ARENA_SIZE (int): The size of the arena
         * HALF_ARENA (int): Half the size of the arena
         * MP (int): A constant representing the Mobile Points resource, used in the get_resource function
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
-        * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
+        * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y].
+          It is built from the turn's units the first time it is used.
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache (:obj: PathCache): Paths already found by find_path_to_edge, with hit and miss counters
+        * construction_times (dict): Seconds spent building each part of this game state, "state" for the turn info,
+          stats and resources, then "game_map", "path_finder" and "threat_grid" once they are first used
 
     """
 
+    @timed("GameState.__init__")
     def __init__(self, config, serialized_string):
         """ Setup a turns variables using arguments passed
 
         Args:
-            * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * config (GameConfig): The compiled game config
+            * serialized_string (string or dict): The game state at the start of this turn, as the JSON string sent by the engine or already decoded
 
         """
+        start = time.perf_counter()
         self.serialized_string = serialized_string
-        self.config = config
+        self.config = check_config(config)
         self.enable_warnings = True
-
-        global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
-        STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+        self.construction_times = {}
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.MP = 1
-        self.SP = 0
-        global MP, SP
-        MP = self.MP
-        SP = self.SP
-
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self.MP = self.config.MP
+        self.SP = self.config.SP
+
+        self._game_map = None
+        self.__path_finder = None
+        self.path_cache = PathCache()
+        self._threat_grids = [None, None]
+        self._attacker_indexes = [None, None]
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
         self.__parse_state(serialized_string)
+        self.construction_times["state"] = time.perf_counter() - start
+
+    @property
+    def game_map(self):
+        """The GameMap of this turn, filled with the turn's units the first time it is used
+        """
+        game_map = self._game_map
+        if game_map is None:
+            game_map = self.__construct("game_map", self.__build_map)
+        return game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        self._game_map = game_map
+
+    @property
+    def _shortest_path_finder(self):
+        finder = self.__path_finder
+        if finder is None:
+            finder = self.__path_finder = self.__construct("path_finder", ArrayPathFinder)
+        return finder
+
+    def __construct(self, name, build):
+        start = time.perf_counter()
+        built = build()
+        self.construction_times[name] = self.construction_times.get(name, 0) + time.perf_counter() - start
+        return built
+
+    def __build_map(self):
+        game_map = self._game_map = GameMap(self.config)
+        game_map.enable_warnings = self.enable_warnings
+        p1units, p2units = self._unit_groups
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+        self._unit_groups = None
+        return game_map
 
     def __parse_state(self, state_line):
         """
-        Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        Reads the turn info, stats and resources of the serialized game state. Its units are kept
+        until game_map is first used, which fills the map so that self.game_map[x,y] is a list of GameUnits at that location.
+        state_line is the game state as a json string, or the dict AlgoCore already decoded it to.
         """
-        state = json.loads(state_line)
+        state = json_loads(state_line) if isinstance(state_line, (str, bytes)) else state_line
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -120,37 +130,30 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
+        self._unit_groups = (state["p1Units"], state["p2Units"])
 
     def __create_parsed_units(self, units, player_number):
         """
-        Helper function for __parse_state to add units to the map.
-        """
-        typedef = self.config.get("unitInformation")
-        for i, unit_types in enumerate(units):
-            for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
-                sx, sy, shp = uinfo[:3]
-                x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
-                    # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+        Helper function for game_map to add the parsed units to the map.
+        Each group of units of a type goes to the map's unit store in bulk, no GameUnits are made.
+        """
+        unit_types = self.config.unit_types
+        game_map = self.game_map
+        store = game_map._store
+        for i, unit_group in enumerate(units):
+            if not unit_group:
+                continue
+            unit_type = unit_types[i]
+            # This depends on RM and UP always being the last types to be processed
+            if unit_type == self.config.REMOVE:
+                game_map._flag_structures(unit_group, store.pending_removal)
+            elif unit_type == self.config.UPGRADE:
+                game_map._flag_structures(unit_group, store.upgraded)
+            else:
+                game_map._place_group(i, player_number, unit_group)
 
     def __resource_required(self, unit_type):
-        return self.SP if is_stationary(unit_type) else self.MP
+        return self.SP if self.config.is_stationary(unit_type) else self.MP
 
     def __set_resource(self, resource_type, amount, player_index=0):
         """
@@ -175,11 +178,43 @@ class GameState:
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
         """
+        self.__send_turn()
+        end_turn(self)
+
+    @timed("GameState.submit_turn")
+    def __send_turn(self):
         build_string = json.dumps(self._build_stack)
         deploy_string = json.dumps(self._deploy_stack)
         send_command(build_string)
         send_command(deploy_string)
 
+    def fork(self):
+        """Makes a copy of this game state for trying out hypothetical turns
+
+        Spawns, removals, resources and the map of the copy can be changed without affecting
+        this game state, see GameMap.fork. Units are only copied once a location is accessed,
+        so forking is cheap enough to do for every candidate plan. The copy shares path_cache,
+        which is keyed on the structures on the map and stays valid for both. If the map was
+        not built yet, the copy builds its own from the turn's units when it is first used.
+
+        Returns:
+            A new GameState for the same turn
+        """
+        clone = GameState.__new__(GameState)
+        clone.__dict__.update(self.__dict__)
+        clone.construction_times = dict(self.construction_times)
+        if self._game_map is not None:
+            clone._game_map = self._game_map.fork()
+        clone.__path_finder = None
+        clone._threat_grids = [grid.fork(clone._game_map) if grid else None for grid in self._threat_grids]
+        # Both maps copy their units on next access, so indexes holding units are rebuilt on both sides
+        clone._attacker_indexes = [None, None]
+        self._attacker_indexes = [None, None]
+        clone._build_stack = list(self._build_stack)
+        clone._deploy_stack = list(self._deploy_stack)
+        clone._player_resources = [dict(resources) for resources in self._player_resources]
+        return clone
+
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
 
@@ -234,10 +269,11 @@ class GameState:
             The number of units affordable of the given unit_type.
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
 
+        MP, SP = self.MP, self.SP
         costs = self.type_cost(unit_type)
         player_held = self.get_resources()
         if costs[MP] > 0 and costs[SP] > 0:
@@ -271,12 +307,13 @@ class GameState:
             self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
+        config = self.config
         for increment in range(1, turns_in_future + 1):
             current_turn = self.turn_number + increment
-            MP *= (1 - self.config["resources"]["bitDecayPerRound"])
-            MP_per_round = self.config["resources"]["bitsPerRound"]
-            MP_ramp_ups = current_turn // self.config["resources"]["turnIntervalForBitSchedule"]
-            MP_per_round_growth = self.config["resources"]["bitGrowthRate"]
+            MP *= (1 - config.mp_decay)
+            MP_per_round = config.mp_per_round
+            MP_ramp_ups = current_turn // config.mp_growth_interval
+            MP_per_round_growth = config.mp_growth
             MP_gained = MP_per_round + (MP_per_round_growth * MP_ramp_ups)
             MP += MP_gained
             MP = round(MP, 1)
@@ -292,16 +329,13 @@ class GameState:
             The units costs as a list [SP, MP]
 
         """
-        if unit_type == REMOVE:
+        if unit_type == self.config.REMOVE:
             self._invalid_unit(unit_type)
             return
-        
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
-        if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
 
-        return cost_base
+        if upgrade:
+            return list(self.config.upgrade_costs.get(unit_type, self.config.costs[unit_type]))
+        return list(self.config.costs[unit_type])
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -320,7 +354,7 @@ class GameState:
             True if we can spawn the unit(s)
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         
@@ -330,10 +364,10 @@ class GameState:
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
+        stationary = self.config.is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = FRIENDLY_EDGE_MASK[tile_id(location[0], location[1])] == 1
 
         if self.enable_warnings:
             fail_reason = ""
@@ -352,6 +386,7 @@ class GameState:
                 (stationary or on_edge) and
                 (not stationary or num == 1))
 
+    @timed("GameState.attempt_spawn")
     def attempt_spawn(self, unit_type, locations, num=1):
         """Attempts to spawn new units with the type given in the given locations.
 
@@ -364,7 +399,7 @@ class GameState:
             The number of units successfully spawned
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.config.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         if num < 1:
@@ -379,10 +414,10 @@ class GameState:
                 if self.can_spawn(unit_type, location, 1):
                     x, y = map(int, location)
                     costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
+                    self.__set_resource(self.SP, 0 - costs[self.SP])
+                    self.__set_resource(self.MP, 0 - costs[self.MP])
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
+                    if self.config.is_stationary(unit_type):
                         self._build_stack.append((unit_type, x, y))
                     else:
                         self._deploy_stack.append((unit_type, x, y))
@@ -407,7 +442,7 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self._build_stack.append((self.config.REMOVE, x, y))
                 removed_units += 1
             else:
                 self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
@@ -435,14 +470,15 @@ class GameState:
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
+                if not existing_unit.upgraded and existing_unit.unit_type in self.config.upgrade_costs:
+                    SP, MP = self.SP, self.MP
                     costs = self.type_cost(existing_unit.unit_type, True)
                     resources = self.get_resources()
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
                         existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self._build_stack.append((self.config.UPGRADE, x, y))
                         spawned_units += 1
             else:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
@@ -471,9 +507,11 @@ class GameState:
         elif right and top:
             return self.game_map.BOTTOM_LEFT
 
+    @timed("GameState.find_path_to_edge")
     def find_path_to_edge(self, start_location, target_edge=None):
         """Gets the path a unit at a given location would take. 
-        If final point is not on an edge, it is a self destruct path
+        If final point is not on an edge, it is a self destruct path.
+        Paths are cached in path_cache, keyed on which tiles currently hold structures.
 
         Args:
             start_location: The location of a hypothetical unit
@@ -491,8 +529,112 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        key = (self.game_map.get_structure_fingerprint(), int(start_location[0]), int(start_location[1]), target_edge)
+        path = self.path_cache.get(key, start_location)
+        if path is None:
+            path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, EDGE_LOCATIONS[target_edge], self)
+            self.path_cache.put(key, path)
+        return path
+
+    def find_paths_to_edge_many(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take.
+        Cheaper than calling find_path_to_edge for each location, as starts heading to the same
+        edge share one search. Paths are read from and added to path_cache.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start_location if None.
+
+        Returns:
+            A list with the path from each start location, in the same order, see find_path_to_edge.
+            The entry is None for blocked start locations.
+
+        """
+        fingerprint = self.game_map.get_structure_fingerprint()
+        paths = [None] * len(start_locations)
+        missing = {}
+        for index, start_location in enumerate(start_locations):
+            if self.contains_stationary_unit(start_location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+                continue
+            edge = self.get_target_edge(start_location) if target_edge is None else target_edge
+            key = (fingerprint, int(start_location[0]), int(start_location[1]), edge)
+            paths[index] = self.path_cache.get(key, start_location)
+            if paths[index] is None:
+                missing.setdefault(edge, []).append((index, key))
+
+        if missing:
+            self._shortest_path_finder.load_blocked(self)
+        for edge, entries in missing.items():
+            starts = [start_locations[index] for index, _ in entries]
+            found = self._shortest_path_finder.navigate_many(starts, EDGE_LOCATIONS[edge])
+            for (index, key), path in zip(entries, found):
+                self.path_cache.put(key, path)
+                paths[index] = path
+        return paths
+
+    def get_path_field(self, target_edge):
+        """Gets a distance field towards an edge for evaluating hypothetical structure placements
+
+        Use block and unblock on the returned field to try placements and undo to revert them,
+        then read paths with find_path. Only the tiles whose distance changes are recomputed.
+
+        Args:
+            target_edge: The edge the field leads to. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+
+        Returns:
+            A DynamicPathField built from the structures currently on the map
+
+        """
+        return DynamicPathField(self, target_edge)
+
+    def get_threat_grid(self, player_index=0):
+        """Gets the damage per frame opposing structures deal to a mobile unit on each tile
+
+        The grid is built on first use and brought up to date with the map on every call,
+        restamping only the structures that changed.
+
+        Args:
+            player_index: The player whose mobile units are threatened, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatGrid, see its damage array and path_damage
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return None
+        grid = self._threat_grids[player_index]
+        if grid is None:
+            grid = self._threat_grids[player_index] = self.__construct("threat_grid", lambda: ThreatGrid(self.game_map, player_index))
+        else:
+            if grid._game_map is None:
+                grid._game_map = self.game_map
+            grid.refresh()
+        return grid
+
+    def get_attackers(self, location, player_index):
+        """Gets the stationary units threatening a given location
+
+        Args:
+            location: The location of a hypothetical defender
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A list of units that would attack a unit controlled by the given player at the given location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return []
+        if not self.game_map.in_arena_bounds(location):
+            self.warn("Location {} is not in the arena bounds.".format(location))
+            return []
+
+        index = self._attacker_indexes[player_index]
+        if index is None:
+            index = self._attacker_indexes[player_index] = AttackerIndex(self.game_map, player_index)
+        return list(index.attackers(tile_id(location[0], location[1])))
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -508,6 +650,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not (self.game_map.get_structure_mask() >> (y * self.ARENA_SIZE + x)) & 1:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -529,7 +673,8 @@ class GameState:
         """
 
         self.enable_warnings = not suppress
-        self.game_map.enable_warnings = not suppress
+        if self._game_map is not None:
+            self._game_map.enable_warnings = not suppress
 
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
@@ -559,17 +704,24 @@ class GameState:
         target_y = self.ARENA_SIZE
         target_x_distance = 0
 
+        # The units in range are read from the unit store's columns, only the target is looked up as a GameUnit
+        game_map = self.game_map
+        store = game_map._store
+        owners, types, healths, stationary_types = store.owner, store.type_id, store.health, store._stationary
+        player_index = attacking_unit.player_index
+        attacks_structures = attacking_unit.damage_f != 0
+        attacks_mobile = attacking_unit.damage_i != 0
         for location in possible_locations:
-            for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
+            for index, slot in enumerate(game_map._tile_slots(location[1] * self.ARENA_SIZE + location[0])):
+                unit_stationary = stationary_types[types[slot]] == 1
+                if owners[slot] == player_index or (not attacks_structures and unit_stationary) or (not attacks_mobile and not unit_stationary):
                     continue
 
                 new_target = False
-                unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
-                unit_health = unit.health
-                unit_y = unit.y
-                unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
+                unit_distance = game_map.distance_between_locations(location, attacker_location)
+                unit_health = healths[slot]
+                unit_y = location[1]
+                unit_x_distance = abs(self.HALF_ARENA - 0.5 - location[0])
 
                 if target_stationary and not unit_stationary:
                     new_target = True
@@ -587,7 +739,7 @@ class GameState:
                     continue
 
                 # Compare height heuristic relative to attacking unit's player index
-                if attacking_unit.player_index == 0:
+                if player_index == 0:
                     if target_y > unit_y:
                         new_target = True
                     elif target_y < unit_y and not new_target:
@@ -602,14 +754,18 @@ class GameState:
                     new_target = True
                 
                 if new_target:
-                    target = unit
+                    target = (location, index)
                     target_stationary = unit_stationary
                     target_distance = unit_distance
                     target_health = unit_health
                     target_y = unit_y
                     target_x_distance = unit_x_distance
+        if target is not None:
+            location, index = target
+            target = game_map[location][index]
         return target
 
+    @timed("GameState.damage_to_demolisher")
     def damage_to_demolisher(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -628,23 +784,13 @@ class GameState:
             self.warn("Location {} is not in the arena bounds.".format(location))
 
         """
-        Get locations in the range of TURRET units
+        Sum the threat grid over the part of the path on our side
         """
-        damage = 0
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
         demolisherpath = self.find_path_to_edge(location)
         pathtocorner = [i for i in demolisherpath if i[1]<=13]
-        for path_point in pathtocorner:
-            possible_turrets= self.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in self.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + 4*unit.damage_i #change 4 to 1/mobileunit.speed
-        return damage 
+        return self.get_threat_grid(player_index).path_damage(pathtocorner, 4) #change 4 to 1/mobileunit.speed
 
+    @timed("GameState.damage_to_scout")
     def damage_to_scout(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -663,69 +809,49 @@ class GameState:
             self.warn("Location {} is not in the arena bounds.".format(location))
 
         """
-        Get locations in the range of TURRET units
+        Sum the threat grid over the path
         """
-        damage = 0
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
         scoutpath = self.find_path_to_edge(location)
-        for path_point in scoutpath:
-            possible_turrets= self.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in self.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + unit.damage_i #change 4 to 1/mobileunit.speed
-        return damage 
+        return self.get_threat_grid(player_index).path_damage(scoutpath)
     
+    @timed("GameState.damage_dealt_mobile")
     def damage_dealt_mobile(self, location, game_state,mobile_unit,number,player_index=0):
-        """Gets the damage to a unit released from location
+        """Gets the damage a group of mobile units released from location deals to enemy structures
+
+        The action phase is simulated with ActionSimulator, so the units fight, take damage and
+        repath as structures fall. Only this group of units is on the board. This used to be a static
+        estimate that read config keys which do not exist, so it always returned 0.
 
         Args:
             location: The location of release
             game_state: current game_state
+            mobile_unit: The type of the mobile units
+            number: How many units are released
+            player_index: The player releasing the units, 0 for you 1 for the enemy
 
         Returns:
-            damage to mobile unit from enemy stationary units if unchanged
+            damage dealt to enemy structures by the units, including self destructs
 
         """
 
         if not player_index == 0 and not player_index == 1:
             game_state._invalid_player_index(player_index)
-        mobile_unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[mobile_unit]]  
-        damage_dealt = 0
-        damage_recieved = 0
-        max_range = mobile_unit_def.get('attackRange', 0)
-        damage_per_frame = mobile_unit_def.get('damage_f', 0)
-        mobile_speed  = mobile_unit_def.get('speed', 0)
-        health_dec  = mobile_unit_def.get('health',0)
-        #max_range is always greater than stat unit.attackrange
-        interpath = game_state.find_path_to_edge(location)
-        for path_point in interpath:
-            possible_turrets= game_state.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in game_state.game_map[location_unit]:
-                    if unit.player_index != player_index:          
-                        if game_state.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:      
-                            for frame in range(round(1/mobile_speed)):
-                                damage_dealt = damage_dealt + damage_per_frame 
-                                if unit.damage_i > 0:
-                                    damage_recieved = damage_recieved + unit.damage_i
-                                if damage_recieved>=health_dec:
-                                    return damage_dealt
-                        elif game_state.game_map.distance_between_locations(path_point, location_unit) <= max_range:
-                           for frame in range(round(1/mobile_speed)):
-                               damage_dealt = damage_dealt + damage_per_frame
-                               
-        return damage_dealt    
+        simulator = ActionSimulator(game_state)
+        simulator.add_units(mobile_unit, location, number, player_index)
+        return simulator.run().structure_damage[player_index]
     
+    @timed("GameState.damage_to_mobile")
     def damage_to_mobile(self, location, game_state,mobile_unit,player_index=0):
         """Gets the damage to a unit released from location
 
+        Every opposing structure in range of a tile of the path hits the unit for 1/speed frames,
+        however long the unit would live. For the damage a unit actually takes, see ActionSimulator.
+
         Args:
             location: The location of release
             game_state: current game_state
+            mobile_unit: The type of the mobile unit
+            player_index: The player releasing the unit, 0 for you 1 for the enemy
 
         Returns:
             damage to mobile unit from enemy stationary units if unchanged
@@ -734,17 +860,7 @@ class GameState:
 
         if not player_index == 0 and not player_index == 1:
             game_state._invalid_player_index(player_index)
-        mobile_unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[mobile_unit]]
-        mobile_speed  = mobile_unit_def.get('speed', 0)
-        damage = 0
-        max_range = 3.5
-
+        mobile_speed = self.config.stats[mobile_unit, False].speed
         interpath = game_state.find_path_to_edge(location)
-        for path_point in interpath:
-            possible_turrets= game_state.game_map.get_locations_in_range(path_point, max_range)
-            for location_unit in possible_turrets:
-                for unit in game_state.game_map[location_unit]:
-                    if unit.damage_i > 0 and unit.player_index != player_index and game_state.game_map.distance_between_locations(path_point, location_unit) <= unit.attackRange:
-                        damage = damage + (1/mobile_speed)*unit.damage_i 
-        return damage 
+        return game_state.get_threat_grid(player_index).path_damage(interpath, 1 / mobile_speed)
     
@@ -2,7 +2,12 @@ import heapq
 import math
 import sys
 import queue
+from collections import OrderedDict
 from .util import debug_write
+from .topology import ARENA_SIZE, HALF_ARENA, TILE_COUNT, TILE_X, TILE_Y, NEIGHBORS, EDGE_TILES, EDGE_LOCATIONS, IDEALNESS
+
+_EMPTY = bytes(TILE_COUNT)
+_UNSET = [-1] * TILE_COUNT
 
 class Node:
     """A pathfinding node
@@ -314,3 +319,518 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class ArrayPathFinder:
+    """Handles pathfinding over flat, preallocated arrays
+
+    Drop in replacement for ShortestPathFinder. It follows the same idealness, validation
+    and tie-break rules, so the paths it returns are identical, but it keeps its search state
+    in buffers indexed by tile id that are reused between calls instead of allocating a grid
+    of Nodes for every search.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+    """
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self._blocked = bytearray(TILE_COUNT)
+        self._visited = bytearray(TILE_COUNT)
+        self._pathlength = list(_UNSET)
+        self._queue = [0] * TILE_COUNT
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.load_blocked(game_state)
+        return self.navigate(start_point, end_points)
+
+    def load_blocked(self, game_state):
+        """Marks every tile holding a structure in game_state as blocked
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        blocked = self._blocked
+        blocked[:] = _EMPTY
+        mask = game_state.game_map.get_structure_mask()
+        while mask:
+            low = mask & -mask
+            blocked[low.bit_length() - 1] = 1
+            mask ^= low
+
+    def navigate(self, start_point, end_points):
+        """Finds a path using the currently loaded blocked tiles
+
+        Args:
+            * start_point: The starting location of the unit, must not be blocked
+            * end_points: The end points of the unit, should be a list of edge locations
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points
+
+        """
+        start = int(start_point[1]) * ARENA_SIZE + int(start_point[0])
+        targets = [int(y) * ARENA_SIZE + int(x) for x, y in end_points]
+        direction = self._get_direction_from_endpoints(end_points)
+        ideal_tile = self._idealness_search(start, set(targets), direction)
+        self._validate(ideal_tile, targets)
+        return [start_point] + [[TILE_X[tile], TILE_Y[tile]] for tile in self._get_path(start, direction)]
+
+    def navigate_many(self, start_points, end_points):
+        """Finds the paths from several starting locations to the same endpoints, using the currently loaded blocked tiles
+
+        The distance field towards the endpoints does not depend on the start, so it is built once and
+        shared by every start whose pocket of pathable space reaches the endpoints. Starts in pockets that
+        cannot reach them share one field per pocket, built from that pocket's most ideal tile.
+
+        Args:
+            * start_points: The starting locations, none of them may be blocked
+            * end_points: The end points of the units, should be a list of edge locations
+
+        Returns:
+            A list with the path from each start point, in the same order
+
+        """
+        targets = [int(y) * ARENA_SIZE + int(x) for x, y in end_points]
+        target_set = set(targets)
+        direction = self._get_direction_from_endpoints(end_points)
+        starts = [int(y) * ARENA_SIZE + int(x) for x, y in start_points]
+        paths = [None] * len(starts)
+
+        self._validate(targets[0], targets)
+        pathlength = self._pathlength
+        stranded = []
+        for index, start in enumerate(starts):
+            if pathlength[start] == -1:
+                stranded.append(index)
+            else:
+                paths[index] = self._get_path(start, direction)
+
+        visited = self._visited
+        while stranded:
+            ideal_tile = self._idealness_search(starts[stranded[0]], target_set, direction)
+            pocket = [index for index in stranded if visited[starts[index]]]
+            stranded = [index for index in stranded if not visited[starts[index]]]
+            self._validate(ideal_tile, targets)
+            for index in pocket:
+                paths[index] = self._get_path(starts[index], direction)
+
+        return [[start_point] + [[TILE_X[tile], TILE_Y[tile]] for tile in path] for start_point, path in zip(start_points, paths)]
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Gets the direction [x,y] of the edge end_points belong to, see ShortestPathFinder
+        """
+        x, y = end_points[0]
+        return (-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1)
+
+    def _idealness_search(self, start, targets, direction):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space.
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        if start in targets:
+            return start
+
+        blocked = self._blocked
+        visited = self._visited
+        queue = self._queue
+        idealness = IDEALNESS[direction]
+        visited[:] = _EMPTY
+
+        visited[start] = 1
+        queue[0] = start
+        head, tail = 0, 1
+        most_ideal = start
+        best_idealness = idealness[start]
+        while head < tail:
+            tile = queue[head]
+            head += 1
+            for neighbor in NEIGHBORS[tile]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                if neighbor in targets:
+                    return neighbor
+                if idealness[neighbor] > best_idealness:
+                    best_idealness = idealness[neighbor]
+                    most_ideal = neighbor
+                visited[neighbor] = 1
+                queue[tail] = neighbor
+                tail += 1
+        return most_ideal
+
+    def _validate(self, ideal_tile, targets):
+        """Breadth first search of the grid, setting the pathlengths of each tile
+        """
+        blocked = self._blocked
+        pathlength = self._pathlength
+        queue = self._queue
+        pathlength[:] = _UNSET
+
+        if ideal_tile in targets:
+            tail = 0
+            for tile in targets:
+                if pathlength[tile] == -1:
+                    pathlength[tile] = 0
+                    queue[tail] = tile
+                    tail += 1
+        else:
+            pathlength[ideal_tile] = 0
+            queue[0] = ideal_tile
+            tail = 1
+
+        head = 0
+        while head < tail:
+            tile = queue[head]
+            head += 1
+            # Blocked endpoints are seeded but never expanded
+            if blocked[tile]:
+                continue
+            next_length = pathlength[tile] + 1
+            for neighbor in NEIGHBORS[tile]:
+                if pathlength[neighbor] == -1 and not blocked[neighbor]:
+                    pathlength[neighbor] = next_length
+                    queue[tail] = neighbor
+                    tail += 1
+
+    def _get_path(self, start, direction):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+
+        Returns:
+            The tile ids the unit moves through, excluding start
+        """
+        pathlength = self._pathlength
+        path = []
+        current = start
+        move_direction = 0
+        while pathlength[current] != 0:
+            next_move = self._choose_next_move(current, move_direction, direction)
+            if TILE_X[current] == TILE_X[next_move]:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(next_move)
+            current = next_move
+        return path
+
+    def _choose_next_move(self, current, previous_move_direction, direction):
+        """Given the current tile and adjacent tiles, return the best 'next step' for a given unit to take
+        """
+        blocked = self._blocked
+        pathlength = self._pathlength
+        ideal_neighbor = current
+        best_pathlength = pathlength[current]
+        for neighbor in NEIGHBORS[current]:
+            if blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(current, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two tiles and return True if the unit would rather move to the new one, see ShortestPathFinder
+        """
+        if previous_move_direction == self.HORIZONTAL and TILE_X[new_tile] != TILE_X[prev_best]:
+            return TILE_Y[prev_tile] != TILE_Y[new_tile]
+        if previous_move_direction == self.VERTICAL and TILE_Y[new_tile] != TILE_Y[prev_best]:
+            return TILE_X[prev_tile] != TILE_X[new_tile]
+        if previous_move_direction == 0:
+            return TILE_Y[prev_tile] != TILE_Y[new_tile]
+
+        if TILE_Y[new_tile] == TILE_Y[prev_best]:
+            if direction[0] == 1:
+                return TILE_X[new_tile] > TILE_X[prev_best]
+            return TILE_X[new_tile] < TILE_X[prev_best]
+        if TILE_X[new_tile] == TILE_X[prev_best]:
+            if direction[1] == 1:
+                return TILE_Y[new_tile] > TILE_Y[prev_best]
+            return TILE_Y[new_tile] < TILE_Y[prev_best]
+        return True
+
+
+class PathCache:
+    """Bounded LRU cache of paths
+
+    Paths are keyed on (structure fingerprint, x, y, target edge), see GameMap.get_structure_fingerprint.
+    A path only depends on which tiles hold structures, so a key never goes stale: placing or
+    removing a structure changes the fingerprint and later lookups simply miss. Old entries are
+    dropped once max_size is reached, least recently used first.
+
+    Attributes :
+        * max_size (int): The maximum number of paths kept
+        * hits (int): The number of lookups that found a path
+        * misses (int): The number of lookups that did not
+
+    """
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def get(self, key, start_location):
+        """Looks up a path
+
+        Args:
+            * key: A (structure fingerprint, x, y, target edge) tuple
+            * start_location: The location the path starts from, it is returned as the first element
+
+        Returns:
+            A new path list, or None if the path is not cached
+
+        """
+        tail = self._paths.get(key)
+        if tail is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._paths.move_to_end(key)
+        return [start_location] + [[x, y] for x, y in tail]
+
+    def put(self, key, path):
+        """Stores a path returned by a path finder
+
+        Args:
+            * key: A (structure fingerprint, x, y, target edge) tuple
+            * path: The path, its first element is the start location
+
+        """
+        self._paths[key] = tuple((x, y) for x, y in path[1:])
+        self._paths.move_to_end(key)
+        if len(self._paths) > self.max_size:
+            self._paths.popitem(last=False)
+
+    def clear(self):
+        """Drops all cached paths, the hit and miss counters are kept
+        """
+        self._paths.clear()
+
+    def stats(self):
+        """Gets the cache counters
+
+        Returns:
+            A dict with the hits, misses, size and hit_rate of the cache
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._paths),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class DynamicPathField:
+    """Distance field towards one edge that is repaired incrementally for what-if queries
+
+    The field is built once from the structures in a GameState. Hypothetical structures are then
+    placed and removed one tile at a time with block and unblock, which only revisit the tiles whose
+    distance to the edge actually changes, and undo rolls the last change back. Paths read from the
+    field are identical to find_path_to_edge on a board with the same blocked tiles.
+
+    Changes to the game_map made after the field was built are not seen by the field.
+
+    Attributes :
+        * target_edge (int): The edge the field leads to, see GameMap.TOP_RIGHT and similar constants
+
+    """
+    def __init__(self, game_state, target_edge):
+        """Builds the field
+
+        Args:
+            * game_state: The GameState whose structures block the field
+            * target_edge: The edge the field leads to
+
+        """
+        self.target_edge = target_edge
+        self._end_points = EDGE_LOCATIONS[target_edge]
+        self._targets = list(EDGE_TILES[target_edge])
+        self._target_set = set(self._targets)
+        self._finder = ArrayPathFinder()
+        self._finder.load_blocked(game_state)
+        self._direction = self._finder._get_direction_from_endpoints(self._end_points)
+        self._finder._validate(self._targets[0], self._targets)
+        # Used for starts cut off from the edge, it shares our blocked tiles but has its own pathlengths
+        self._pocket_finder = ArrayPathFinder()
+        self._pocket_finder._blocked = self._finder._blocked
+        self._history = []
+
+    def block(self, location):
+        """Places a hypothetical structure, repairing the distances that depended on its tile
+
+        Args:
+            location: The location to block
+
+        Returns:
+            The number of tiles whose distance to the edge changed
+        """
+        tile = int(location[1]) * ARENA_SIZE + int(location[0])
+        blocked = self._finder._blocked
+        pathlength = self._finder._pathlength
+        changes = []
+        self._history.append((tile, blocked[tile], changes))
+        if blocked[tile]:
+            return 0
+
+        blocked[tile] = 1
+        old_length = pathlength[tile]
+        # A blocked tile keeps the value a fresh search would give it: 0 for a seeded endpoint, -1 otherwise
+        changes.append((tile, old_length))
+        pathlength[tile] = 0 if tile in self._target_set else -1
+        if old_length == -1:
+            return len(changes)
+
+        # Collect the tiles that lost every neighbor one step closer to the edge, level by level
+        affected = set()
+        checked = set()
+        queue = [neighbor for neighbor in NEIGHBORS[tile] if not blocked[neighbor] and pathlength[neighbor] == old_length + 1]
+        head = 0
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            if current in checked:
+                continue
+            checked.add(current)
+            length = pathlength[current]
+            supported = False
+            for neighbor in NEIGHBORS[current]:
+                if not blocked[neighbor] and neighbor not in affected and pathlength[neighbor] == length - 1:
+                    supported = True
+                    break
+            if supported:
+                continue
+            affected.add(current)
+            for neighbor in NEIGHBORS[current]:
+                if not blocked[neighbor] and pathlength[neighbor] == length + 1:
+                    queue.append(neighbor)
+
+        # Recompute the affected tiles from the unaffected tiles around them
+        heap = []
+        for current in affected:
+            changes.append((current, pathlength[current]))
+            best = -1
+            for neighbor in NEIGHBORS[current]:
+                if not blocked[neighbor] and neighbor not in affected and pathlength[neighbor] != -1:
+                    if best == -1 or pathlength[neighbor] + 1 < best:
+                        best = pathlength[neighbor] + 1
+            pathlength[current] = best
+            if best != -1:
+                heapq.heappush(heap, (best, current))
+        while heap:
+            length, current = heapq.heappop(heap)
+            if length != pathlength[current]:
+                continue
+            for neighbor in NEIGHBORS[current]:
+                if neighbor in affected and (pathlength[neighbor] == -1 or pathlength[neighbor] > length + 1):
+                    pathlength[neighbor] = length + 1
+                    heapq.heappush(heap, (length + 1, neighbor))
+        return len(changes)
+
+    def unblock(self, location):
+        """Removes a structure, repairing the distances that can now route through its tile
+
+        Args:
+            location: The location to unblock
+
+        Returns:
+            The number of tiles whose distance to the edge changed
+        """
+        tile = int(location[1]) * ARENA_SIZE + int(location[0])
+        blocked = self._finder._blocked
+        pathlength = self._finder._pathlength
+        changes = []
+        self._history.append((tile, blocked[tile], changes))
+        if not blocked[tile]:
+            return 0
+
+        blocked[tile] = 0
+        length = -1
+        if tile in self._target_set:
+            length = 0
+        else:
+            for neighbor in NEIGHBORS[tile]:
+                if not blocked[neighbor] and pathlength[neighbor] != -1:
+                    if length == -1 or pathlength[neighbor] + 1 < length:
+                        length = pathlength[neighbor] + 1
+        changes.append((tile, pathlength[tile]))
+        pathlength[tile] = length
+        if length == -1:
+            return len(changes)
+
+        queue = [tile]
+        head = 0
+        while head < len(queue):
+            current = queue[head]
+            head += 1
+            next_length = pathlength[current] + 1
+            for neighbor in NEIGHBORS[current]:
+                if not blocked[neighbor] and (pathlength[neighbor] == -1 or pathlength[neighbor] > next_length):
+                    changes.append((neighbor, pathlength[neighbor]))
+                    pathlength[neighbor] = next_length
+                    queue.append(neighbor)
+        return len(changes)
+
+    def undo(self):
+        """Reverts the most recent block or unblock
+
+        Returns:
+            False if there was nothing to undo, True otherwise
+        """
+        if not self._history:
+            return False
+        tile, was_blocked, changes = self._history.pop()
+        pathlength = self._finder._pathlength
+        for changed_tile, old_length in reversed(changes):
+            pathlength[changed_tile] = old_length
+        self._finder._blocked[tile] = was_blocked
+        return True
+
+    def get_pathlength(self, location):
+        """Gets the number of steps from a location to the edge
+
+        Args:
+            location: A location in the arena
+
+        Returns:
+            The number of steps, or -1 if the location is blocked or cannot reach the edge
+        """
+        tile = int(location[1]) * ARENA_SIZE + int(location[0])
+        if self._finder._blocked[tile]:
+            return -1
+        return self._finder._pathlength[tile]
+
+    def find_path(self, start_location):
+        """Gets the path a unit at start_location would take to the field's edge, see GameState.find_path_to_edge
+
+        Args:
+            start_location: The location of a hypothetical unit
+
+        Returns:
+            The path, or None if start_location is blocked
+        """
+        tile = int(start_location[1]) * ARENA_SIZE + int(start_location[0])
+        if self._finder._blocked[tile]:
+            return None
+        if self._finder._pathlength[tile] == -1:
+            return self._pocket_finder.navigate(start_location, self._end_points)
+        return [start_location] + [[TILE_X[step], TILE_Y[step]] for step in self._finder._get_path(tile, self._direction)]
@@ -0,0 +1,252 @@
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from .game_config import GameConfig
+from .game_state import GameState
+from .simulator import ActionSimulator
+from .util import debug_write
+
+
+def structure_damage(result):
+    """Scores a SimulationResult by the damage your units dealt to enemy structures
+
+    Args:
+        result: A SimulationResult
+
+    Returns:
+        The score, higher is better
+    """
+    return result.structure_damage[0]
+
+
+def breach_damage(result):
+    """Scores a SimulationResult by the health your units took from the enemy
+
+    Args:
+        result: A SimulationResult
+
+    Returns:
+        The score, higher is better
+    """
+    return result.breach_damage[0]
+
+
+def simulate_plan(game_state, plan, deadline=None):
+    """Simulates one attack plan
+
+    Args:
+        game_state: The GameState to attack from, it is not changed
+        plan: A list of (unit_type, location, num) spawns for player 0, the arguments of attempt_spawn
+        deadline: A time.time() at which to stop simulating, see ActionSimulator.run. No limit if None.
+
+    Returns:
+        The SimulationResult of the action phase
+    """
+    simulator = ActionSimulator(game_state)
+    for unit_type, location, num in plan:
+        simulator.add_units(unit_type, location, num)
+    return simulator.run(deadline)
+
+
+def _snapshot(game_state):
+    # The structures, stats and resources of a game state as the engine would send them, all a simulation needs.
+    # Much smaller to send to a worker than the GameState, which carries its path cache and unit store.
+    config = game_state.config
+    game_map = game_state.game_map
+    store = game_map._store
+    structure_slots = game_map._structure_slots
+    remove, upgrade = config.UNIT_TYPE_TO_INDEX[config.REMOVE], config.UNIT_TYPE_TO_INDEX[config.UPGRADE]
+    units = ([[] for _ in config.unit_types], [[] for _ in config.unit_types])
+    mask = game_map.get_structure_mask()
+    while mask:
+        low = mask & -mask
+        tile = low.bit_length() - 1
+        mask ^= low
+        slot = structure_slots[tile]
+        if store.owner[slot] != 0 and store.owner[slot] != 1:
+            continue
+        player_units = units[store.owner[slot]]
+        entry = [store.x[slot], store.y[slot], store.health[slot], ""]
+        player_units[store.type_id[slot]].append(entry)
+        if store.upgraded[slot]:
+            player_units[upgrade].append(entry)
+        if store.pending_removal[slot]:
+            player_units[remove].append(entry)
+    resources = [game_state.get_resources(player_index) for player_index in (0, 1)]
+    state = {
+        "turnInfo": [0, game_state.turn_number, -1],
+        "p1Stats": [game_state.my_health, resources[0][0], resources[0][1], game_state.my_time],
+        "p2Stats": [game_state.enemy_health, resources[1][0], resources[1][1], game_state.enemy_time],
+        "p1Units": units[0],
+        "p2Units": units[1],
+    }
+    return config.raw, state
+
+
+# A worker keeps the last game state it was sent, so plans of one batch only unpickle and parse it once
+_worker_state = (None, None)
+
+
+def _evaluate_in_worker(token, snapshot_blob, plan, score, deadline):
+    global _worker_state
+    if _worker_state[0] != token:
+        config, state = pickle.loads(snapshot_blob)
+        _worker_state = (token, GameState(GameConfig(config), state))
+    result = simulate_plan(_worker_state[1], plan, deadline)
+    return None if result.timed_out else score(result)
+
+
+def _start_worker():
+    return os.getpid()
+
+
+def _pool_context():
+    # Forking a process that runs other threads can leave locks held in the child, so workers are started
+    # fresh. ProcessPoolExecutor takes mp_context from Python 3.7, older versions fork when start is called.
+    if sys.version_info < (3, 7):
+        return {}
+    methods = multiprocessing.get_all_start_methods()
+    return {"mp_context": multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")}
+
+
+class PlanEvaluator:
+    """Scores candidate attack plans in parallel with a time limit
+
+    Plans are simulated with ActionSimulator in a pool of worker processes, so all cores
+    are used while the turn timer runs. Simulations stop at the deadline, and plans that have
+    not finished by then are left out. When there is a single core, or the pool can not be
+    started, plans are simulated one after the other in this process with the same deadline.
+
+    Workers are sent the structures, stats and resources of the game state, not the GameState
+    itself, and mobile units already on the map are left out. They are not forked from this
+    process, which may be running other threads, but started fresh with forkserver or spawn
+    where Python allows choosing. Call start from the main thread so they are ready before the
+    first turn.
+
+    Attributes :
+        * workers (int): The number of worker processes, 0 to always evaluate in this process
+
+    """
+    def __init__(self, workers=None):
+        """Sets up the evaluator, the pool is only started by start or when first needed
+
+        Args:
+            workers: The number of worker processes. One less than the number of cores if None.
+
+        """
+        self.workers = max(0, (os.cpu_count() or 1) - 1) if workers is None else workers
+        self._pool = None
+        self._futures = ()
+        self._tokens = itertools.count()
+
+    def evaluate(self, game_state, plans, timeout=None, score=structure_damage):
+        """Scores attack plans
+
+        Args:
+            game_state: The GameState to attack from, it is not changed
+            plans: A list of plans, each a list of (unit_type, location, num) spawns for player 0
+            timeout: Seconds to wait for results. No limit if None.
+            score: A function from a SimulationResult to a number, higher is better. Must be defined at module level so it can be sent to workers.
+
+        Returns:
+            A list with the score of each plan, in the same order, None for plans that did not finish in time
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        scores = [None] * len(plans)
+        pool = self.__get_pool() if len(plans) > 1 else None
+        if pool is not None:
+            try:
+                self.__evaluate_in_pool(pool, game_state, plans, deadline, score, scores)
+                return scores
+            except BrokenProcessPool:
+                debug_write("Plan evaluation pool stopped working, evaluating plans in process")
+                self.close()
+                self.workers = 0
+        for index, plan in enumerate(plans):
+            if scores[index] is not None:
+                continue
+            if deadline is not None and time.time() >= deadline:
+                break
+            result = simulate_plan(game_state, plan, deadline)
+            if not result.timed_out:
+                scores[index] = score(result)
+        return scores
+
+    def best_plan(self, game_state, plans, timeout=None, score=structure_damage):
+        """Finds the plan with the highest score, see evaluate
+
+        Args:
+            game_state: The GameState to attack from, it is not changed
+            plans: A list of plans, each a list of (unit_type, location, num) spawns for player 0
+            timeout: Seconds to wait for results. No limit if None.
+            score: A function from a SimulationResult to a number, higher is better
+
+        Returns:
+            The best plan and its score, the earliest plan wins ties. (None, None) if no plan finished in time.
+        """
+        best = best_score = None
+        for plan, plan_score in zip(plans, self.evaluate(game_state, plans, timeout, score)):
+            if plan_score is not None and (best_score is None or plan_score > best_score):
+                best, best_score = plan, plan_score
+        return best, best_score
+
+    def start(self):
+        """Starts the worker processes now rather than on the first evaluation, call it from the main thread
+
+        Returns:
+            True if there is a pool of workers, False if plans will be evaluated in this process
+        """
+        pool = self.__get_pool()
+        if pool is None:
+            return False
+        try:
+            for future in [pool.submit(_start_worker) for _ in range(self.workers)]:
+                future.result()
+        except BrokenProcessPool:
+            debug_write("Plan evaluation pool stopped working, evaluating plans in process")
+            self.close()
+            self.workers = 0
+            return False
+        return True
+
+    def close(self):
+        """Stops the worker processes, a new pool is started if the evaluator is used again
+        """
+        if self._pool is not None:
+            # shutdown only takes cancel_futures from Python 3.9, so queued plans are cancelled here
+            for future in self._futures:
+                future.cancel()
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self._futures = ()
+
+    def __get_pool(self):
+        if self._pool is None and self.workers > 0:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, **_pool_context())
+            except (OSError, NotImplementedError) as error:
+                debug_write("Could not start plan evaluation pool, evaluating plans in process: {}".format(error))
+                self.workers = 0
+        return self._pool
+
+    def __evaluate_in_pool(self, pool, game_state, plans, deadline, score, scores):
+        token = (os.getpid(), next(self._tokens))
+        snapshot_blob = pickle.dumps(_snapshot(game_state), protocol=pickle.HIGHEST_PROTOCOL)
+        futures = {pool.submit(_evaluate_in_worker, token, snapshot_blob, plan, score, deadline): index for index, plan in enumerate(plans)}
+        self._futures = tuple(futures)
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                scores[futures[future]] = future.result()
+        # Plans still queued are dropped, plans already running stop at the deadline in their worker
+        for future in pending:
+            future.cancel()
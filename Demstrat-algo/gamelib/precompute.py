@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from .navigation import PathCache
+from .topology import ARENA_SIZE, EDGE_LOCATIONS
+from .util import debug_write
+
+# The precomputer is optional, AlgoStrategy only runs it when GAMELIB_PRECOMPUTE is set
+ENABLED = bool(os.environ.get("GAMELIB_PRECOMPUTE"))
+
+
+def board_fingerprint(game_map):
+    """Gets a fingerprint of the structures on a map
+
+    Args:
+        game_map: A GameMap
+
+    Returns:
+        A value that is equal for two maps exactly when they hold the same structures, with the same owners, types and upgrades
+    """
+    store = game_map._store
+    structure_slots = game_map._structure_slots
+    structures = []
+    for player_index in (0, 1):
+        mask = game_map.get_structure_mask(player_index)
+        while mask:
+            low = mask & -mask
+            tile = low.bit_length() - 1
+            mask ^= low
+            slot = structure_slots[tile]
+            structures.append((tile, player_index, store.type_id[slot], store.upgraded[slot]))
+    return tuple(structures)
+
+
+def state_fingerprint(game_state):
+    """Gets the board_fingerprint of a GameState's map, from the units of the turn if the map is not built yet
+
+    Args:
+        game_state: A GameState
+
+    Returns:
+        The board_fingerprint its map has or would have once built
+    """
+    if game_state._game_map is not None:
+        return board_fingerprint(game_state._game_map)
+    config = game_state.config
+    stationary = [bool(unit_type) and config.stats[unit_type, False].stationary for unit_type in config.unit_types]
+    upgrade = config.UNIT_TYPE_TO_INDEX[config.UPGRADE]
+    # Mirrors how GameState fills the map: a structure replaces what is on its tile, then the upgrades of its player are applied
+    structures = {}
+    for player_index, groups in enumerate(game_state._unit_groups):
+        for type_id, group in enumerate(groups):
+            if stationary[type_id]:
+                for entry in group:
+                    structures[int(entry[1]) * ARENA_SIZE + int(entry[0])] = [player_index, type_id, 0]
+            elif type_id == upgrade:
+                for entry in group:
+                    structure = structures.get(int(entry[1]) * ARENA_SIZE + int(entry[0]))
+                    if structure is not None:
+                        structure[2] = 1
+    # Ordered by player then tile, like board_fingerprint
+    return tuple(sorted(((tile, player_index, type_id, upgraded) for tile, (player_index, type_id, upgraded) in structures.items()),
+                        key=lambda structure: (structure[1], structure[0])))
+
+
+class Precomputer:
+    """Uses the idle time of the action phase to prepare the next turn
+
+    After a turn is submitted, start runs a background thread on a fork of the submitted
+    state, whose map holds the structures just built. This projects the next turn's board
+    assuming nothing is destroyed in the action phase. The thread fills a path cache with
+    paths from every edge tile, builds both threat grids and runs any extra tasks, such as
+    scoring candidate plans.
+
+    At the start of the next turn, adopt hands this work to the new GameState if its board
+    matches the projection, and drops it otherwise. Work that has not finished by then is
+    dropped too, so adopt never waits. How often the work is used is counted in hits and
+    misses, see stats.
+
+    Attributes :
+        * tasks (dict): Extra work to run on the projected GameState, from a name to a function taking the GameState
+        * results (dict): The result of each task from the last adopted projection
+        * enable_warnings (bool): If true, debug messages for the precomputer will print out
+        * hits (int): The number of turns that used the precomputed work
+        * misses (int): The number of turns that had to drop it, because it was not ready or the board did not match
+
+    """
+    def __init__(self, tasks=None):
+        """Sets up the precomputer, nothing runs until start is called
+
+        Args:
+            tasks: A dict from a name to a function taking the projected GameState, whose results are given by adopt
+
+        """
+        self.tasks = dict(tasks or {})
+        self.results = {}
+        self.enable_warnings = True
+        self.hits = 0
+        self.misses = 0
+        self._job = None
+
+    def start(self, game_state):
+        """Starts precomputing the next turn in a background thread
+
+        Args:
+            game_state: The GameState that was submitted, it is not changed
+        """
+        self.cancel()
+        projection = game_state.fork()
+        projection.path_cache = PathCache()
+        projection.suppress_warnings(True)
+        # Each run writes to its own job, so a cancelled thread that is still finishing can not hand over its work
+        self._job = job = {"stop": threading.Event(), "work": None}
+        job["thread"] = threading.Thread(target=self.__run, args=(projection, job), daemon=True)
+        job["thread"].start()
+
+    def cancel(self):
+        """Drops any work in progress, the thread stops at its next step
+        """
+        if self._job is not None:
+            self._job["stop"].set()
+        self._job = None
+
+    def wait(self, timeout=None):
+        """Waits for the work in progress to finish
+
+        Args:
+            timeout: The most seconds to wait, no limit if None
+
+        Returns:
+            True if no work is running anymore
+        """
+        job = self._job
+        if job is None:
+            return True
+        job["thread"].join(timeout)
+        return not job["thread"].is_alive()
+
+    def adopt(self, game_state):
+        """Hands the precomputed work to a new turn's GameState if its board is the projected one
+
+        The path cache and threat grids of game_state are replaced, and the task results are
+        kept in results. The board is compared with state_fingerprint, so a map that was not
+        built yet stays unbuilt.
+
+        Args:
+            game_state: The GameState of the new turn
+
+        Returns:
+            True if the work was used, False if it was not ready or the board did not match
+        """
+        job = self._job
+        self.cancel()
+        self.results = {}
+        if job is None:
+            return False
+        if job["work"] is None or job["work"][0] != state_fingerprint(game_state):
+            self.misses += 1
+            self.warn("Precomputed work dropped, used on {hits} of {lookups} turns".format(**self.stats()))
+            return False
+        fingerprint, path_cache, threat_grids, results = job["work"]
+        path_cache.hits = path_cache.misses = 0
+        game_state.path_cache = path_cache
+        game_state._threat_grids = [grid.fork(game_state._game_map) for grid in threat_grids]
+        self.results = results
+        self.hits += 1
+        self.warn("Precomputed work used on {hits} of {lookups} turns".format(**self.stats()))
+        return True
+
+    def stats(self):
+        """Gets how often the precomputed work was used
+
+        Returns:
+            A dict with the hits, misses, lookups and hit_rate of the calls to adopt that followed a start
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "lookups": lookups,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def __run(self, projection, job):
+        # Hands the GIL straight back, so start returns without waiting for the work
+        time.sleep(0)
+        start = time.time()
+        stop = job["stop"]
+        try:
+            fingerprint = board_fingerprint(projection.game_map)
+            game_map = projection.game_map
+            for edge in EDGE_LOCATIONS:
+                if stop.is_set():
+                    return
+                projection.find_paths_to_edge_many([list(location) for location in edge if not game_map.is_blocked(location)])
+            threat_grids = []
+            for player_index in (0, 1):
+                if stop.is_set():
+                    return
+                threat_grids.append(projection.get_threat_grid(player_index))
+            results = {}
+            for name, task in self.tasks.items():
+                if stop.is_set():
+                    return
+                results[name] = task(projection)
+        except Exception as error:
+            self.warn("Precomputing the next turn failed: {!r}".format(error))
+            return
+        if not stop.is_set():
+            job["work"] = (fingerprint, projection.path_cache, threat_grids, results)
+            self.warn("Precomputed the next turn in {:.1f} ms".format((time.time() - start) * 1000))
+
+    def warn(self, message):
+        """
+        Used internally by the precomputer to print out default messaging
+        """
+        if self.enable_warnings:
+            debug_write(message)
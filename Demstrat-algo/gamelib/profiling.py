@@ -0,0 +1,93 @@
+"""
+Per turn timing of the hot paths in gamelib, switched on with the GAMELIB_PROFILE environment variable.
+
+Set GAMELIB_PROFILE to a file path and every submitted turn appends one JSON line to it:
+
+    {"turn": 3, "calls": {"GameState.find_path_to_edge": {"count": 12, "total_ms": 4.1, "max_ms": 1.2}, ...},
+     "path_cache": {"hits": 9, "misses": 3, "size": 3, "hit_rate": 0.75},
+     "construction_ms": {"state": 0.05, "game_map": 0.2, "path_finder": 0.01}}
+
+construction_ms shows which parts of the GameState were built, and how long each took, see
+GameState.construction_times. Parts the turn never used are left out.
+
+Times are inclusive, so a call that makes other timed calls counts their time too. Calls made in
+PlanEvaluator worker processes are not included. The file is never stdout, which carries the turns.
+
+When GAMELIB_PROFILE is not set, timed returns functions unchanged, so there is no cost at all.
+"""
+import atexit
+import functools
+import json
+import os
+import time
+
+PROFILE_PATH = os.environ.get("GAMELIB_PROFILE") or None
+ENABLED = PROFILE_PATH is not None
+
+# name -> [count, total seconds, max seconds] for the current turn
+_stats = {}
+_output = None
+
+
+def timed(name):
+    """Decorator recording the calls and latency of a function when profiling is enabled
+
+    Args:
+        name: The name to report the function under
+
+    Returns:
+        A decorator, which returns the function itself when profiling is disabled
+    """
+    if not ENABLED:
+        return lambda function: function
+    return functools.partial(_wrap, name)
+
+
+def _wrap(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = _stats.get(name)
+            if stats is None:
+                _stats[name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+    return wrapper
+
+
+def turn_record(game_state):
+    """Builds the record for a turn from the calls timed since the last record, then starts counting afresh
+
+    Args:
+        game_state: The GameState of the turn
+
+    Returns:
+        A dict ready to be written as JSON
+    """
+    calls = {name: {"count": count, "total_ms": round(total * 1000, 3), "max_ms": round(longest * 1000, 3)}
+             for name, (count, total, longest) in sorted(_stats.items())}
+    _stats.clear()
+    construction = {name: round(seconds * 1000, 3) for name, seconds in game_state.construction_times.items()}
+    return {"turn": game_state.turn_number, "calls": calls, "path_cache": game_state.path_cache.stats(), "construction_ms": construction}
+
+
+def end_turn(game_state):
+    """Writes the record for a turn to GAMELIB_PROFILE, called by GameState.submit_turn
+
+    Args:
+        game_state: The GameState of the turn
+    """
+    global _output
+    if not ENABLED:
+        return
+    if _output is None:
+        _output = open(PROFILE_PATH, "a")
+        atexit.register(_output.close)
+    _output.write(json.dumps(turn_record(game_state)) + "\n")
@@ -0,0 +1,265 @@
+"""
+Recording of the engine protocol and offline replays of recorded games.
+
+Set GAMELIB_RECORD to a file path and AlgoCore.start writes every line read from the engine
+(config, turns and action frames) and every command sent back to it into a gzip compressed
+JSON lines file, one record per line:
+
+    {"time": 1.204, "dir": "in", "line": "{\"turnInfo\": [0, 3, -1], ...}"}
+
+time is in seconds from the start of the recording, dir is "in" for engine messages and "out"
+for commands. A recording can then be fed to any AlgoStrategy without the engine:
+
+    python3 -m gamelib.replay game.jsonl.gz
+
+which reports how long the algo took on each message and whether it sent the recorded commands.
+"""
+import argparse
+import atexit
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+from . import util
+from .events import turn_info
+from .util import debug_write
+
+RECORD_PATH = os.environ.get("GAMELIB_RECORD") or None
+
+# Set while a recording is being replayed, so the replay is not recorded again
+_replaying = False
+
+MessageTiming = namedtuple("MessageTiming", ["kind", "turn", "frame", "latency"])
+MessageTiming.__doc__ = """How long the algo spent on one engine message, kind is one of "config", "turn", "frame", "end" or "unknown" """
+
+
+class Recorder:
+    """Writes the lines exchanged with the engine to a gzip compressed JSON lines file
+
+    The file is flushed after each command, so a game cut short by the engine still leaves
+    a readable recording of every turn that was answered.
+
+    Attributes :
+        * path (str): The file being written
+
+    """
+    def __init__(self, path):
+        """Opens the file, replacing any previous recording
+
+        Args:
+            path: The file to write
+
+        """
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._start = time.time()
+
+    def record(self, direction, line):
+        """Adds a line to the recording
+
+        Args:
+            direction: "in" for a line read from the engine, "out" for a line sent to it
+            line: The line, without its newline
+        """
+        self._file.write(json.dumps({"time": round(time.time() - self._start, 6), "dir": direction, "line": line.rstrip("\n")}) + "\n")
+        if direction == "out":
+            self._file.flush()
+
+    def close(self):
+        """Finishes the file
+        """
+        if not self._file.closed:
+            self._file.close()
+
+
+def start_recording(path=None):
+    """Starts recording the lines exchanged with the engine, called by AlgoCore.start
+
+    Args:
+        path: The file to write. GAMELIB_RECORD if None, in which case nothing is recorded when it is not set.
+
+    Returns:
+        The Recorder, or None if nothing is recorded
+    """
+    path = path or RECORD_PATH
+    if path is None or _replaying:
+        return None
+    if util._recorder is not None:
+        util._recorder.close()
+    recorder = Recorder(path)
+    util._recorder = recorder
+    atexit.register(recorder.close)
+    return recorder
+
+
+def stop_recording():
+    """Stops recording and finishes the file
+    """
+    if util._recorder is not None:
+        util._recorder.close()
+        util._recorder = None
+
+
+def read_recording(path):
+    """Reads the records of a recording
+
+    A recording cut off mid write, for example when the engine killed the algo, is read up
+    to its last complete record.
+
+    Args:
+        path: The recording
+
+    Returns:
+        A list of dicts with the keys time, dir and line
+    """
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as recording:
+            for line in recording:
+                if line.endswith("\n"):
+                    records.append(json.loads(line))
+    except (EOFError, zlib.error) as error:
+        debug_write("Recording {} is truncated, replaying its first {} records: {}".format(path, len(records), error))
+    return records
+
+
+def message_kind(line):
+    """Tells what kind of engine message a line is, the same way AlgoCore.start does
+
+    Args:
+        line: A line sent by the engine
+
+    Returns:
+        A (kind, turn, frame) tuple, turn and frame are None when the message has none
+    """
+    if "replaySave" in line:
+        return "config", None, None
+    if "turnInfo" not in line:
+        return "unknown", None, None
+    info = turn_info(line)
+    kind = {0: "turn", 1: "frame", 2: "end"}.get(int(info[0]), "unknown")
+    return kind, info[1], info[2]
+
+
+class _ReplayInput:
+    """Stands in for stdin, giving out the recorded engine lines and timing the algo between reads"""
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._current = None
+        self._start = None
+        self.timings = []
+
+    def readline(self):
+        self.finish()
+        line = next(self._lines, None)
+        if line is None:
+            return ""
+        self._current = message_kind(line)
+        self._start = time.perf_counter()
+        return line + "\n"
+
+    def finish(self):
+        if self._current is not None:
+            self.timings.append(MessageTiming(*self._current, time.perf_counter() - self._start))
+            self._current = None
+
+
+class ReplayReport:
+    """The result of replaying a recording
+
+    Attributes :
+        * timings (list): A MessageTiming for each engine message, in order
+        * commands (list): The commands the algo sent
+        * recorded_commands (list): The commands sent when the game was recorded
+
+    """
+    def __init__(self, timings, commands, recorded_commands):
+        self.timings = timings
+        self.commands = commands
+        self.recorded_commands = recorded_commands
+
+    def matches_recording(self):
+        """Checks if the algo sent the same commands as when the game was recorded
+
+        Returns:
+            True if the commands are the same
+        """
+        return self.commands == self.recorded_commands
+
+    def summary(self):
+        """Sums up the latency of each kind of message
+
+        Returns:
+            A dict from message kind to a dict with count, total_ms, mean_ms and max_ms
+        """
+        by_kind = {}
+        for timing in self.timings:
+            by_kind.setdefault(timing.kind, []).append(timing.latency)
+        return {kind: {"count": len(latencies),
+                       "total_ms": round(sum(latencies) * 1000, 3),
+                       "mean_ms": round(sum(latencies) * 1000 / len(latencies), 3),
+                       "max_ms": round(max(latencies) * 1000, 3)}
+                for kind, latencies in by_kind.items()}
+
+
+def replay(algo, path):
+    """Feeds a recording to an algo as if it came from the engine
+
+    stdin and stdout are swapped out while the algo runs, so the commands it sends are
+    captured instead of printed. Debug output still goes to stderr.
+
+    Args:
+        algo: An AlgoCore, usually a new AlgoStrategy
+        path: The recording
+
+    Returns:
+        A ReplayReport
+    """
+    global _replaying
+    records = read_recording(path)
+    replay_input = _ReplayInput([record["line"] for record in records if record["dir"] == "in"])
+    replay_output = io.StringIO()
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin, sys.stdout = replay_input, replay_output
+    _replaying = True
+    try:
+        algo.start()
+    except SystemExit:
+        # get_command exits when the recording ends without an end message
+        pass
+    finally:
+        replay_input.finish()
+        sys.stdin, sys.stdout = stdin, stdout
+        _replaying = False
+    commands = replay_output.getvalue().splitlines()
+    recorded_commands = [record["line"] for record in records if record["dir"] == "out"]
+    return ReplayReport(replay_input.timings, commands, recorded_commands)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replays a game recorded with GAMELIB_RECORD and reports the algo's latency per message")
+    parser.add_argument("recording", help="The recorded game")
+    parser.add_argument("--algo", default="algo_strategy:AlgoStrategy", help="The algo class to replay, as module:Class")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    module_name, class_name = args.algo.split(":")
+    algo = getattr(importlib.import_module(module_name), class_name)()
+    report = replay(algo, args.recording)
+
+    print("{:>7} {:>6} {:>6} {:>12}".format("kind", "turn", "frame", "latency (ms)"))
+    for timing in report.timings:
+        print("{:>7} {:>6} {:>6} {:>12.3f}".format(timing.kind, "" if timing.turn is None else timing.turn,
+                                                  "" if timing.frame is None else timing.frame, timing.latency * 1000))
+    print(json.dumps(report.summary(), indent=2))
+    print("Commands match the recording" if report.matches_recording() else "Commands differ from the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+from .util import debug_write
+
+
+class TurnScheduler:
+    """Runs a turn's strategy stages against a deadline and always submits a turn
+
+    Stages are functions taking a GameState. They run in priority order in a worker thread,
+    each on a fork of the state the previous stages produced. A stage that finishes in time
+    is kept, so when the deadline comes the turn built by the finished stages is submitted
+    and the rest is dropped. Expensive stages can work as anytime computations, calling commit
+    whenever they have something better and checking time_left to stop once time is up.
+
+    Python threads can not be stopped, so a stage that overruns keeps running in the background
+    until it returns, but nothing it does after the deadline reaches the game and time_left is 0
+    for it. Stages may change the strategy as well as the GameState they are given, so the next
+    turn's stages only start once it has returned, out of that turn's time.
+
+    Attributes :
+        * soft_limit (float): The turn time in seconds the engine allows before penalising, from waitTimeBotSoft in the config
+        * safety_margin (float): Seconds kept free before soft_limit for submitting
+        * min_budget (float): The least time in seconds given to stages, however slow earlier turns were
+
+    """
+    def __init__(self, config, safety_margin=0.5, min_budget=0.1):
+        """Reads the time limits from the config
+
+        Args:
+            config: The game config
+            safety_margin: Seconds kept free before the soft limit for submitting
+            min_budget: The least time in seconds given to stages
+
+        """
+        self.soft_limit = config.get("timingAndReplay", {}).get("waitTimeBotSoft", 5000) / 1000
+        self.safety_margin = safety_margin
+        self.min_budget = min_budget
+        self._overheads = deque(maxlen=5)
+        self._last_duration = None
+        self._deadline = None
+        self._turn = 0
+        self._committed = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def time_limit(self):
+        """Gets the time stages have each turn
+
+        This is the soft limit less the safety margin, less the largest gap seen recently between
+        the time the engine measured for a turn (my_time) and the time measured here, which covers
+        the time spent reading the game state and sending the turn.
+
+        Returns:
+            The time in seconds
+        """
+        overhead = max(self._overheads) if self._overheads else 0
+        return max(self.min_budget, self.soft_limit - self.safety_margin - overhead)
+
+    def time_left(self):
+        """Gets the time left before the current turn's deadline
+
+        Returns:
+            The time in seconds, at least 0. 0 for stages of a turn that ended, the full time_limit when no turn is running.
+        """
+        if getattr(self._local, "turn", self._turn) != self._turn:
+            return 0.0
+        if self._deadline is None:
+            return self.time_limit()
+        return max(0.0, self._deadline - time.time())
+
+    def commit(self, game_state):
+        """Keeps the turn planned so far by an anytime stage, to submit if the stage runs out of time
+
+        Only has an effect when called from a stage of the turn that is running. The game state
+        is forked, so the stage can carry on changing it.
+
+        Args:
+            game_state: The GameState holding the best turn so far
+        """
+        if getattr(self._local, "turn", None) != self._turn:
+            return
+        snapshot = game_state.fork()
+        with self._lock:
+            if getattr(self._local, "turn", None) == self._turn:
+                self._committed = snapshot
+
+    def run_turn(self, game_state, stages, start_time=None):
+        """Runs the stages, then submits the best turn found before the deadline
+
+        Args:
+            game_state: The GameState of this turn
+            stages: Functions taking a GameState, in priority order
+            start_time: When the turn started, as given by time.time(). Now if None.
+
+        Returns:
+            The GameState that was submitted
+        """
+        start_time = time.time() if start_time is None else start_time
+        if self._last_duration is not None and game_state.my_time > 0:
+            self._overheads.append(max(0.0, game_state.my_time / 1000 - self._last_duration))
+        self._turn += 1
+        self._deadline = start_time + self.time_limit()
+        self._committed = game_state.fork()
+
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            debug_write("Waiting for a stage of an earlier turn to finish before starting turn {}".format(game_state.turn_number))
+            worker.join(max(0.0, self._deadline - time.time()))
+        if worker is None or not worker.is_alive():
+            worker = self._worker = threading.Thread(target=self.__run_stages, args=(self._turn, stages), daemon=True)
+            worker.start()
+            worker.join(max(0.0, self._deadline - time.time()))
+        with self._lock:
+            if worker.is_alive():
+                debug_write("Turn {} ran out of time, submitting the turn planned so far".format(game_state.turn_number))
+            submitted = self._committed
+            self._turn += 1
+            self._committed = None
+
+        submitted.submit_turn()
+        self._deadline = None
+        self._last_duration = time.time() - start_time
+        return submitted
+
+    def __run_stages(self, turn, stages):
+        self._local.turn = turn
+        for stage in stages:
+            with self._lock:
+                if turn != self._turn:
+                    return
+                state = self._committed.fork()
+            try:
+                stage(state)
+            except Exception as error:
+                debug_write("Stage {} failed and was skipped: {!r}".format(getattr(stage, "__name__", stage), error))
+                continue
+            with self._lock:
+                if turn != self._turn:
+                    return
+                self._committed = state
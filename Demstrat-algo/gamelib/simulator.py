@@ -0,0 +1,354 @@
+import math
+import time
+from .topology import HALF_ARENA, TILE_COUNT, TILE_X, TILE_Y, TARGET_EDGE, EDGE_MASKS, tile_id, disc_tiles
+
+
+class SimulationResult:
+    """The outcome of an action phase run by ActionSimulator
+
+    Every list is indexed by player, 0 for you 1 for the enemy. Damage beyond the remaining health of a unit is not counted.
+
+    Attributes :
+        * frames (int): The number of frames simulated
+        * breaches (list): The number of mobile units of each player that reached their target edge
+        * breach_damage (list): The health each player's breaches took from the opponent
+        * structure_damage (list): The damage each player's mobile units dealt to opposing structures, self destructs included
+        * mobile_damage_taken (list): The damage each player's mobile units took
+        * destroyed (list): For each player, the locations of their structures that were destroyed, in order
+        * self_destructs (list): The number of mobile units of each player that self destructed
+        * timed_out (bool): True if the simulation was stopped by its deadline before the action phase was over
+
+    """
+    def __init__(self):
+        self.frames = 0
+        self.breaches = [0, 0]
+        self.breach_damage = [0.0, 0.0]
+        self.structure_damage = [0.0, 0.0]
+        self.mobile_damage_taken = [0.0, 0.0]
+        self.destroyed = [[], []]
+        self.self_destructs = [0, 0]
+        self.timed_out = False
+
+    def __str__(self):
+        return "SimulationResult(frames={}, breaches={}, structure_damage={}, mobile_damage_taken={}, destroyed={})".format(
+            self.frames, self.breaches, self.structure_damage, self.mobile_damage_taken, [len(locations) for locations in self.destroyed])
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ActionSimulator:
+    """Steps an action phase frame by frame from a GameState
+
+    Each frame supports shield new mobile units in range, mobile units move once every 1/speed frames,
+    every unit attacks the target GameState.get_target would pick, and units left without health are removed.
+    Destroyed structures make mobile units repath, breaching on their target edge or self destructing at the end of their path.
+
+    Units are kept in flat lists indexed by tile or by unit rather than as GameUnits, and the board is a fork of the
+    game state, so paths come from its shared path cache and the game state itself is never changed.
+
+    Differences from the engine to be aware of: repathing starts without the unit's previous move direction,
+    and units already without health are not picked as targets again in the same frame.
+
+    Attributes :
+        * game_state (:obj: GameState): The fork of the game state the simulation runs on
+        * max_frames (int): The simulation stops after this many frames
+
+    """
+    def __init__(self, game_state, max_frames=500):
+        """Loads the structures of a game state
+
+        Args:
+            game_state: The GameState to simulate from, it is forked and not changed
+            max_frames: The simulation stops after this many frames
+
+        """
+        self.game_state = game_state.fork()
+        self.max_frames = max_frames
+        config = game_state.config
+        self._type_info = {info.get("shorthand"): info for info in config["unitInformation"]}
+        self._hit_radius = config.hit_radius
+
+        # Structures, indexed by tile
+        self._health = [0.0] * TILE_COUNT
+        self._owner = [-1] * TILE_COUNT
+        self._stats = [None] * TILE_COUNT
+        self._types = [None] * TILE_COUNT
+        self._turrets = []
+        self._supports = []
+        self._hit = set()
+        game_map = self.game_state.game_map
+        store = game_map._store
+        stats_table, unit_types, type_ids, upgraded = store._stats, store.unit_types, store.type_id, store.upgraded
+        structure_slots = game_map._structure_slots
+        mask = game_map.get_structure_mask()
+        while mask:
+            low = mask & -mask
+            tile = low.bit_length() - 1
+            mask ^= low
+            slot = structure_slots[tile]
+            type_id = type_ids[slot]
+            stats = self._stats[tile] = stats_table[type_id][upgraded[slot]]
+            self._types[tile] = unit_types[type_id]
+            self._health[tile] = store.health[slot]
+            self._owner[tile] = store.owner[slot]
+            if stats.damage_i > 0 or stats.damage_f > 0:
+                self._turrets.append(tile)
+            if stats.shieldPerUnit > 0 and stats.shieldRange > 0:
+                self._supports.append(tile)
+
+        # Mobile units, indexed by the order they were added
+        self._m_type = []
+        self._m_player = []
+        self._m_tile = []
+        self._m_health = []
+        self._m_edge = []
+        self._m_frames_per_move = []
+        self._m_wait = []
+        self._m_steps = []
+        self._m_path = []
+        self._m_path_index = []
+        self._m_path_version = []
+        self._m_shielded = []
+        self._alive = []
+        self._path_version = 0
+
+    def add_units(self, unit_type, location, num=1, player_index=0):
+        """Adds mobile units that start the action phase at a location
+
+        Spawn rules and resources are not checked, see GameState.can_spawn.
+
+        Args:
+            unit_type: The type of mobile unit, SCOUT, DEMOLISHER or INTERCEPTOR
+            location: The location the units start from
+            num: The number of units
+            player_index: The player controlling the units, 0 for you 1 for the enemy
+
+        """
+        info = self._type_info[unit_type]
+        tile = tile_id(location[0], location[1])
+        frames_per_move = max(1, round(1 / info["speed"])) if info.get("speed") else 1
+        for _ in range(num):
+            self._m_type.append(unit_type)
+            self._m_player.append(player_index)
+            self._m_tile.append(tile)
+            self._m_health.append(float(info.get("startHealth", 0)))
+            self._m_edge.append(TARGET_EDGE[tile])
+            self._m_frames_per_move.append(frames_per_move)
+            self._m_wait.append(frames_per_move)
+            self._m_steps.append(0)
+            self._m_path.append(None)
+            self._m_path_index.append(0)
+            self._m_path_version.append(-1)
+            self._m_shielded.append(set())
+            self._alive.append(True)
+
+    def run(self, deadline=None):
+        """Simulates frames until no mobile units are left or max_frames is reached
+
+        Args:
+            deadline: A time.time() at which to stop, with the result marked timed_out. No limit if None.
+
+        Returns:
+            A SimulationResult
+        """
+        result = SimulationResult()
+        while any(self._alive) and result.frames < self.max_frames:
+            if deadline is not None and time.time() >= deadline:
+                result.timed_out = True
+                break
+            self._shield()
+            self._move(result)
+            self._attack(result)
+            self._remove_dead(result)
+            result.frames += 1
+        return result
+
+    def _occupied(self):
+        # Tile to the indexes of the live mobile units on it, per player
+        occupied = ({}, {})
+        for index, alive in enumerate(self._alive):
+            if alive:
+                occupied[self._m_player[index]].setdefault(self._m_tile[index], []).append(index)
+        return occupied
+
+    def _in_range(self, tile, target, attack_range):
+        dx = TILE_X[tile] - TILE_X[target]
+        dy = TILE_Y[tile] - TILE_Y[target]
+        return math.sqrt(dx ** 2 + dy ** 2) < attack_range + self._hit_radius
+
+    def _shield(self):
+        if not self._supports:
+            return
+        occupied = self._occupied()
+        for tile in self._supports:
+            if self._health[tile] <= 0:
+                continue
+            stats = self._stats[tile]
+            amount = stats.shieldPerUnit
+            if stats.upgraded:
+                amount += self._type_info[self._types[tile]].get("upgrade", {}).get("shieldBonusPerY", 0) * TILE_Y[tile]
+            for target, indexes in occupied[self._owner[tile]].items():
+                if self._in_range(tile, target, stats.shieldRange):
+                    for index in indexes:
+                        if tile not in self._m_shielded[index]:
+                            self._m_shielded[index].add(tile)
+                            self._m_health[index] += amount
+
+    def _move(self, result):
+        for index, alive in enumerate(self._alive):
+            if not alive:
+                continue
+            self._m_wait[index] -= 1
+            if self._m_wait[index] > 0:
+                continue
+            self._m_wait[index] = self._m_frames_per_move[index]
+
+            if self._m_path_version[index] != self._path_version:
+                tile = self._m_tile[index]
+                self._m_path[index] = self.game_state.find_path_to_edge([TILE_X[tile], TILE_Y[tile]], self._m_edge[index]) or [[TILE_X[tile], TILE_Y[tile]]]
+                self._m_path_index[index] = 0
+                self._m_path_version[index] = self._path_version
+
+            path = self._m_path[index]
+            if self._m_path_index[index] + 1 < len(path):
+                self._m_path_index[index] += 1
+                x, y = path[self._m_path_index[index]]
+                tile = self._m_tile[index] = tile_id(x, y)
+                self._m_steps[index] += 1
+                if EDGE_MASKS[self._m_edge[index]][tile] and self._m_path_index[index] + 1 == len(path):
+                    self._breach(index, result)
+            else:
+                self._self_destruct(index, result)
+
+    def _breach(self, index, result):
+        player = self._m_player[index]
+        result.breaches[player] += 1
+        result.breach_damage[player] += self._type_info[self._m_type[index]].get("playerBreachDamage", 1)
+        self._alive[index] = False
+
+    def _self_destruct(self, index, result):
+        player = self._m_player[index]
+        info = self._type_info[self._m_type[index]]
+        self._alive[index] = False
+        if self._m_steps[index] < info.get("selfDestructStepsRequired", 5):
+            return
+        result.self_destructs[player] += 1
+        tile = self._m_tile[index]
+        damage_f = info.get("selfDestructDamageTower", 0)
+        damage_i = info.get("selfDestructDamageWalker", 0)
+        for target in disc_tiles(tile, info.get("selfDestructRange", 0), self._hit_radius):
+            if damage_f > 0 and self._health[target] > 0 and self._owner[target] != player:
+                self._damage_structure(target, damage_f, player, result)
+        if damage_i > 0:
+            for target, indexes in self._occupied()[1 - player].items():
+                if self._in_range(tile, target, info.get("selfDestructRange", 0)):
+                    for other in indexes:
+                        self._damage_mobile(other, damage_i, result)
+
+    def _damage_structure(self, tile, damage, player, result):
+        # Damage past a target's remaining health is not counted
+        if player is not None:
+            result.structure_damage[player] += min(damage, self._health[tile])
+        self._health[tile] -= damage
+        self._hit.add(tile)
+
+    def _damage_mobile(self, index, damage, result):
+        result.mobile_damage_taken[self._m_player[index]] += min(damage, max(self._m_health[index], 0))
+        self._m_health[index] -= damage
+
+    def _attack(self, result):
+        occupied = self._occupied()
+
+        for tile in self._turrets:
+            if self._health[tile] <= 0:
+                continue
+            stats = self._stats[tile]
+            if stats.damage_i > 0:
+                target = self._best_mobile(tile, stats.attackRange, self._owner[tile], occupied)
+                if target is not None:
+                    self._damage_mobile(target, stats.damage_i, result)
+                    continue
+            if stats.damage_f > 0:
+                target = self._best_structure(tile, stats.attackRange, self._owner[tile])
+                if target is not None:
+                    self._damage_structure(target, stats.damage_f, None, result)
+
+        # Units stacked on a tile pick the same target until it dies, as only that target's health changed
+        last_key = last_target = None
+        for index, alive in enumerate(self._alive):
+            if not alive or self._m_health[index] <= 0:
+                continue
+            player = self._m_player[index]
+            info = self._type_info[self._m_type[index]]
+            damage_f = info.get("attackDamageTower", 0)
+            damage_i = info.get("attackDamageWalker", 0)
+            key = (self._m_tile[index], player, self._m_type[index])
+            if key == last_key and last_target is not None:
+                stationary, target = last_target
+                if (self._health[target] if stationary else self._m_health[target]) <= 0:
+                    last_target = None
+            if key != last_key or last_target is None:
+                last_key = key
+                last_target = None
+                tile = self._m_tile[index]
+                attack_range = info.get("attackRange", 0)
+                if damage_i > 0:
+                    target = self._best_mobile(tile, attack_range, player, occupied)
+                    if target is not None:
+                        last_target = (False, target)
+                if last_target is None and damage_f > 0:
+                    target = self._best_structure(tile, attack_range, player)
+                    if target is not None:
+                        last_target = (True, target)
+            if last_target is None:
+                continue
+            stationary, target = last_target
+            if stationary:
+                self._damage_structure(target, damage_f, player, result)
+            else:
+                self._damage_mobile(target, damage_i, result)
+
+    def _priority(self, tile, target, health, player):
+        # Nearest, then lowest health, then furthest back for the attacker, then closest to an edge, see GameState.get_target.
+        # Remaining ties go to the lowest x, the order get_target scans locations in
+        x, y = TILE_X[target], TILE_Y[target]
+        distance = math.sqrt((TILE_X[tile] - x) ** 2 + (TILE_Y[tile] - y) ** 2)
+        return (distance, health, y if player == 0 else -y, -abs(HALF_ARENA - 0.5 - x), x)
+
+    def _best_mobile(self, tile, attack_range, player, occupied):
+        best = best_priority = None
+        for target, indexes in occupied[1 - player].items():
+            if not self._in_range(tile, target, attack_range):
+                continue
+            for index in indexes:
+                health = self._m_health[index]
+                if health <= 0:
+                    continue
+                priority = self._priority(tile, target, health, player)
+                if best is None or priority < best_priority:
+                    best, best_priority = index, priority
+        return best
+
+    def _best_structure(self, tile, attack_range, player):
+        best = best_priority = None
+        for target in disc_tiles(tile, attack_range, self._hit_radius):
+            health = self._health[target]
+            if health <= 0 or self._owner[target] == player:
+                continue
+            priority = self._priority(tile, target, health, player)
+            if best is None or priority < best_priority:
+                best, best_priority = target, priority
+        return best
+
+    def _remove_dead(self, result):
+        for index, alive in enumerate(self._alive):
+            if alive and self._m_health[index] <= 0:
+                self._alive[index] = False
+        for tile in sorted(self._hit):
+            if self._stats[tile] is not None and self._health[tile] <= 0:
+                result.destroyed[self._owner[tile]].append([TILE_X[tile], TILE_Y[tile]])
+                self._stats[tile] = None
+                self.game_state.game_map.remove_unit([TILE_X[tile], TILE_Y[tile]])
+                self._path_version += 1
+        self._hit.clear()
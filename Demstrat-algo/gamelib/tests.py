@@ -1,7 +1,28 @@
 import unittest
 import json
+import math
+import io
+import time
+import contextlib
+import os
+import sys
+import tempfile
 from .game_state import GameState
-from .unit import GameUnit
+from .game_config import GameConfig
+from .game_map import GameMap
+from .unit import GameUnit, unit_stats
+from .unit_store import UnitStore
+from .navigation import ShortestPathFinder, ArrayPathFinder
+from .simulator import ActionSimulator
+from .planner import PlanEvaluator, simulate_plan, _snapshot
+from .scheduler import TurnScheduler
+from .precompute import Precomputer, board_fingerprint, state_fingerprint
+from . import topology
+from . import profiling
+from . import replay
+from . import util
+from . import events
+from .algocore import AlgoCore
 
 class BasicTests(unittest.TestCase):
 
@@ -188,7 +209,7 @@ class BasicTests(unittest.TestCase):
         """
         turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
         
-        state = GameState(json.loads(config), turn_0)
+        state = GameState(GameConfig(json.loads(config)), turn_0)
         state.suppress_warnings(True)
         return state
 
@@ -240,7 +261,41 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
 
-    def _test_get_attackers(self):
+    def test_structure_bitboards(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 5], 0)
+        game.game_map.add_unit("DF", [14, 5], 0)
+        game.game_map.add_unit("DF", [13, 20], 1)
+        game.game_map.add_unit("EI", [13, 6], 0)
+        self.assertTrue(game.game_map.is_blocked([13, 5]), "Walls block")
+        self.assertFalse(game.game_map.is_blocked([13, 6]), "Mobile units do not block")
+        self.assertFalse(game.game_map.is_blocked([0, 0]), "Out of bounds tiles are not blocked")
+        self.assertEqual(3, game.game_map.count_structures(), "There are three structures")
+        self.assertEqual(2, game.game_map.count_structures(0), "I have two structures")
+        self.assertEqual(2, game.game_map.count_structures(unit_type="DF"), "There are two turrets")
+        self.assertEqual(topology.locations_mask([[13, 20]]), game.game_map.get_structure_mask(1, "DF"), "Enemy turret mask is wrong")
+
+        game.game_map.add_unit("EF", [14, 5], 1)
+        self.assertEqual(0, game.game_map.count_structures(0, "DF"), "Replacing a structure should clear its bit")
+        self.assertEqual([topology.tile_id(14, 5)], topology.mask_tiles(game.game_map.get_structure_mask(1, "EF")), "Enemy support mask is wrong")
+        game.game_map.remove_unit([13, 5])
+        game.game_map[13, 20] = []
+        self.assertEqual(topology.locations_mask([[14, 5]]), game.game_map.get_structure_mask(), "Removed structures should be cleared")
+        self.assertFalse(game.contains_stationary_unit([13, 5]), "The wall was removed")
+
+    def test_range_tables(self):
+        game = self.make_turn_0_map()
+        for location in [[13, 13], [0, 13], [14, 27], [3, 10], [20, 6]]:
+            for radius in [0, 1, 1.5, 2.5, 3.5, 4.5, 7]:
+                expected = [[x, y] for x in range(location[0] - 7, location[0] + 8) for y in range(location[1] - 7, location[1] + 8)
+                            if game.game_map.in_arena_bounds([x, y]) and abs(x - location[0]) <= math.ceil(radius) and abs(y - location[1]) <= math.ceil(radius)
+                            and game.game_map.distance_between_locations(location, [x, y]) < radius + 0.01]
+                self.assertEqual(expected, game.game_map.get_locations_in_range(location, radius), "Wrong locations in range {} of {}".format(radius, location))
+                tiles = game.game_map.get_tiles_in_range(location, radius)
+                self.assertEqual(expected, [[tile % 28, tile // 28] for tile in tiles], "Wrong tiles in range {} of {}".format(radius, location))
+        self.assertEqual([[0, 13]], game.game_map.get_locations_in_range([-1, 13], 1), "Off board centers should still find on board locations")
+
+    def test_get_attackers(self):
         game = self.make_turn_0_map()
         
         self.assertEqual([], game.get_attackers([13,13], 0), "Are we being attacked by a ghost?")
@@ -255,6 +310,570 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [13,14], 1)
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
+        game.game_map.remove_unit([12,14])
+        self.assertEqual(2, len(game.get_attackers([13,13], 0)), "Removed turrets should not attack")
+        game.game_map.add_unit("DF", [13,10], 1)
+        self.assertEqual(2, len(game.get_attackers([13,13], 0)), "That turret is out of range")
+        self.assertEqual(1, len(game.get_attackers([12,13], 1)), "The enemy should be in danger from my turret")
+
+    def test_get_attackers_after_upgrade(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13,16], 1)
+        self.assertEqual([], game.get_attackers([13,13], 0), "That turret is out of range")
+        game.game_map[13,16][0].upgrade()
+        self.assertEqual(1, len(game.get_attackers([13,13], 0)), "The upgraded turret reaches further")
+
+        game.game_map.add_unit("DF", [13,5], 0)
+        self.assertEqual([], game.get_attackers([13,8], 1), "That turret is out of range")
+        game._player_resources[0]['SP'] = 30
+        self.assertEqual(1, game.attempt_upgrade([13,5]), "We should be able to upgrade")
+        attackers = game.get_attackers([13,8], 1)
+        self.assertEqual(1, len(attackers), "The upgraded turret reaches further")
+        self.assertTrue(attackers[0].upgraded, "The attacker should be the upgraded turret")
+
+    def test_array_path_finder(self):
+        game = self.make_turn_0_map()
+        for location in [[13, 2], [14, 2], [12, 3], [15, 3], [11, 4], [16, 4], [10, 5], [17, 5], [4, 13], [5, 12], [6, 11], [20, 13]]:
+            game.game_map.add_unit("FF", location, 0)
+        for location in [[13, 16], [14, 16], [12, 15], [15, 15], [1, 14], [26, 14], [13, 27], [14, 27]]:
+            game.game_map.add_unit("DF", location, 1)
+        reference, engine = ShortestPathFinder(), ArrayPathFinder()
+        for start in [[13, 0], [14, 0], [3, 10], [24, 10], [13, 1], [13, 13], [14, 14], [0, 13], [27, 14], [13, 26]]:
+            for edge in range(4):
+                end_points = game.game_map.get_edge_locations(edge)
+                expected = reference.navigate_multiple_endpoints(start, end_points, game)
+                self.assertEqual(expected, engine.navigate_multiple_endpoints(start, end_points, game), "Paths from {} to edge {} differ".format(start, edge))
+        self.assertEqual(None, engine.navigate_multiple_endpoints([13, 2], game.game_map.get_edge_locations(0), game), "Pathed from a blocked tile")
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        first = game.find_path_to_edge([13, 0])
+        self.assertEqual(first, game.find_path_to_edge([13, 0]), "Cached path differs")
+        self.assertEqual((1, 1), (game.path_cache.hits, game.path_cache.misses), "Second lookup should hit the cache")
+        first.append([0, 0])
+        self.assertNotEqual(first, game.find_path_to_edge([13, 0]), "Cached paths should not be shared with callers")
+
+        game.game_map.add_unit("FF", first[3], 0)
+        blocked = game.find_path_to_edge([13, 0])
+        self.assertNotIn(first[3], blocked, "Placing a structure should invalidate the path")
+        self.assertEqual(2, game.path_cache.misses, "Placing a structure should change the cache key")
+        game.game_map.add_unit("EI", [13, 13], 0)
+        game.find_path_to_edge([13, 0])
+        self.assertEqual(2, game.path_cache.misses, "Mobile units do not block paths")
+        game.game_map.remove_unit(first[3])
+        self.assertEqual(first[:-1], game.find_path_to_edge([13, 0]), "Removing the structure should restore the path")
+        self.assertEqual(2, game.path_cache.misses, "The unblocked board was already cached")
+
+    def test_find_paths_to_edge_many(self):
+        game = self.make_turn_0_map()
+        # Wall off a pocket around [6, 9] and a second one on the right so some starts cannot reach their edge
+        for location in [[4, 9], [5, 10], [6, 11], [7, 10], [8, 9], [7, 8], [6, 7], [5, 8], [20, 6], [21, 7], [22, 6], [21, 5]]:
+            game.game_map.add_unit("FF", location, 0)
+        for location in [[12, 20], [13, 20], [14, 20], [15, 19]]:
+            game.game_map.add_unit("DF", location, 1)
+        edges = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        starts = edges + [[6, 9], [5, 9], [6, 8], [21, 6], [13, 10], [6, 7]]
+        expected = [ArrayPathFinder().navigate_multiple_endpoints(start, game.game_map.get_edge_locations(game.get_target_edge(start)), game) for start in starts]
+        self.assertEqual(expected, game.find_paths_to_edge_many(starts), "Batch paths differ from single paths")
+        self.assertEqual(len([path for path in expected if path]), game.path_cache.misses, "Every unblocked start should have been searched once")
+        self.assertEqual([6, 10], expected[-6][-1], "The walled off start should self destruct inside its pocket")
+        self.assertEqual(expected[:5], [game.find_path_to_edge(start) for start in starts[:5]], "Batch paths should be cached")
+        self.assertEqual(expected[20:], game.find_paths_to_edge_many(starts[20:], None), "Batch paths should be served from the cache")
+
+    def test_dynamic_path_field(self):
+        game = self.make_turn_0_map()
+        for location in [[10, 5], [11, 5], [12, 5], [13, 5], [14, 5], [15, 5], [16, 5]]:
+            game.game_map.add_unit("FF", location, 0)
+        field = game.get_path_field(game.game_map.TOP_RIGHT)
+        original = game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT)
+        self.assertEqual(original, field.find_path([13, 0]), "Field path differs from find_path_to_edge")
+
+        for location in [[17, 5], [9, 5], [13, 4]]:
+            field.block(location)
+            game.game_map.add_unit("FF", location, 0)
+            self.assertEqual(game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), field.find_path([13, 0]), "Path after blocking {} differs".format(location))
+        field.unblock([12, 5])
+        game.game_map.remove_unit([12, 5])
+        self.assertEqual(game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), field.find_path([13, 0]), "Path after unblocking differs")
+        self.assertEqual(-1, field.get_pathlength([13, 4]), "Blocked tiles have no pathlength")
+
+        for _ in range(4):
+            self.assertTrue(field.undo(), "There should be a change to undo")
+        self.assertFalse(field.undo(), "Every change was undone")
+        self.assertEqual(original, field.find_path([13, 0]), "Undo should restore the original field")
+        self.assertEqual(None, field.find_path([12, 5]), "Pathed from a blocked tile")
+
+    def test_topology(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(list(game.game_map), [[x, y] for y in range(28) for x in range(28) if topology.in_bounds(x, y)], "Iteration should follow tile ids")
+        self.assertEqual(420, len(topology.IN_BOUNDS_TILES), "The diamond has 420 tiles")
+        for edge in range(4):
+            tiles = [topology.tile_id(x, y) for x, y in game.game_map.get_edge_locations(edge)]
+            self.assertEqual(list(topology.EDGE_TILES[edge]), tiles, "Edge {} tiles are wrong".format(edge))
+            self.assertTrue(all(topology.on_edge(tile, edge) for tile in tiles), "Edge {} membership is wrong".format(edge))
+        for x, y in [[13, 0], [3, 10], [24, 10], [0, 14], [27, 14], [14, 27]]:
+            tile = topology.tile_id(x, y)
+            self.assertEqual(game.get_target_edge([x, y]), topology.TARGET_EDGE[tile], "Target edge of {} is wrong".format([x, y]))
+            self.assertEqual(topology.tile_id(27 - x, y), topology.MIRROR_X[tile], "Mirror of {} is wrong".format([x, y]))
+            self.assertEqual(topology.tile_id(27 - x, 27 - y), topology.MIRROR[tile], "Opponent mirror of {} is wrong".format([x, y]))
+            neighbors = [topology.tile_id(*location) for location in [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]] if game.game_map.in_arena_bounds(location)]
+            self.assertEqual(tuple(neighbors), topology.NEIGHBORS[tile], "Neighbors of {} are wrong".format([x, y]))
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 5], 0)
+        game.game_map.add_unit("DF", [14, 20], 1)
+        game.attempt_spawn("FF", [[12, 5]])
+        fork = game.fork()
+        fork.game_map[13, 5][0].health = 1
+        fork.game_map.remove_unit([14, 20])
+        fork.game_map.add_unit("DF", [15, 5], 0)
+        fork.attempt_spawn("FF", [[11, 5]])
+        self.assertEqual(75, game.game_map[13, 5][0].health, "Damaging a forked unit should not change the original")
+        self.assertEqual(1, fork.game_map[13, 5][0].health, "The fork should keep its own changes")
+        self.assertEqual(1, len(game.game_map[14, 20]), "Removing from the fork should not change the original")
+        self.assertFalse(game.contains_stationary_unit([15, 5]), "Adding to the fork should not change the original")
+        self.assertEqual(topology.locations_mask([[12, 5], [13, 5], [14, 20]]), game.game_map.get_structure_mask(), "Original structure mask changed")
+        self.assertEqual(topology.locations_mask([[11, 5], [12, 5], [13, 5], [15, 5]]), fork.game_map.get_structure_mask(), "Fork structure mask is wrong")
+        self.assertEqual(1, len(game._build_stack), "Spawning in the fork should not change the original")
+        self.assertEqual(game.get_resource(game.SP) - 1, fork.get_resource(game.SP), "Fork resources are wrong")
+
+    def test_threat_grid(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 16], 1)
+        grid = game.get_threat_grid(0)
+        self.assertEqual(5, grid.damage_at([13, 14]), "A turret two tiles away is in range")
+        self.assertEqual(0, grid.damage_at([13, 13]), "A turret three tiles away is out of range")
+        self.assertEqual(0, game.get_threat_grid(1).damage_at([13, 14]), "My units are not threatened by enemy turrets")
+
+        game.game_map[13, 16][0].upgrade()
+        self.assertEqual(15, game.get_threat_grid(0).damage_at([13, 13]), "Upgrading should restamp the turret")
+        game.game_map.add_unit("DF", [14, 16], 1)
+        fork = game.fork()
+        fork.game_map.remove_unit([13, 16])
+        self.assertEqual(20, game.get_threat_grid(0).damage_at([13, 14]), "Threat from turrets should add up")
+        self.assertEqual(5, fork.get_threat_grid(0).damage_at([13, 14]), "The fork should only see its own turrets")
+        self.assertEqual(4 * 20, game.get_threat_grid(0).path_damage([[13, 14], [13, 12]], 4), "Path damage is wrong")
+        self.assertEqual(0, grid.refresh(), "Nothing should change without structure changes")
+        grid._sources = None
+        self.assertEqual(0, grid.refresh(), "The structures should not be looked at again without changes")
+        grid._sources = {}
+
+    def test_action_simulator(self):
+        game = self.make_turn_0_map()
+        simulator = ActionSimulator(game)
+        simulator.add_units("PI", [13, 0], 3)
+        result = simulator.run()
+        self.assertEqual([3, 0], result.breaches, "Scouts on an empty board should all score")
+        self.assertEqual([3.0, 0], result.breach_damage, "Each scout should deal one breach damage")
+
+        for x in range(0, 28):
+            game.game_map.add_unit("FF", [x, 14], 1)
+        game.game_map.add_unit("DF", [13, 16], 1)
+        simulator = ActionSimulator(game)
+        simulator.add_units("EI", [13, 0], 2)
+        result = simulator.run()
+        self.assertEqual([0, 0], result.breaches, "A full wall cannot be crossed")
+        self.assertTrue(result.structure_damage[0] > 0, "Demolishers should damage the wall")
+        self.assertEqual([2, 0], result.self_destructs, "Blocked demolishers should self destruct")
+        self.assertEqual(75, game.game_map[13, 14][0].health, "Simulating should not change the game state")
+        self.assertEqual(result.structure_damage[0], game.damage_dealt_mobile([13, 0], game, "EI", 2), "damage_dealt_mobile should match the simulator")
+
+    def test_damage_to_mobile(self):
+        game = self.make_turn_0_map()
+        for location in [[24, 14], [25, 16], [22, 15], [10, 13], [20, 16]]:
+            game.game_map.add_unit("DF", location, 1)
+        game.game_map.add_unit("FF", [23, 14], 1)
+        game.game_map[25, 16][0].upgrade()
+        for unit_type in ["PI", "EI"]:
+            expected = 0
+            for path_point in game.find_path_to_edge([13, 0]):
+                for location in game.game_map.get_locations_in_range(path_point, 3.5):
+                    for unit in game.game_map[location]:
+                        if unit.damage_i > 0 and unit.player_index != 0 and game.game_map.distance_between_locations(path_point, location) <= unit.attackRange:
+                            expected += (1 / unit_stats(game.config, unit_type).speed) * unit.damage_i
+            self.assertAlmostEqual(expected, game.damage_to_mobile([13, 0], game, unit_type), msg="Every turret in range should hit for each frame on the tile")
+        self.assertTrue(game.damage_to_mobile([13, 0], game, "EI") > 0, "The path should be in range of turrets")
+
+    def test_plan_evaluator(self):
+        game = self.make_turn_0_map()
+        for x in range(0, 28):
+            game.game_map.add_unit("FF", [x, 14], 1)
+        game.game_map[13, 14][0].health = 20
+        game.game_map[5, 14][0].pending_removal = True
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.game_map[13, 16][0].upgrade()
+        plans = [[("EI", [13, 0], 1)], [("EI", [13, 0], 3)], [("PI", [14, 0], 2)]]
+
+        raw_config, state = _snapshot(game)
+        snapshot = GameState(GameConfig(raw_config), state)
+        for filters in [{}, {"upgraded": True}, {"pending_removal": True}, {"below_health": 50}]:
+            self.assertEqual(sorted(game.game_map.find_units(**filters)), sorted(snapshot.game_map.find_units(**filters)), "Workers should get the same structures")
+        self.assertEqual(str(simulate_plan(game, plans[1])), str(simulate_plan(snapshot, plans[1])), "Workers should simulate the same action phase")
+
+        serial = PlanEvaluator(0)
+        scores = serial.evaluate(game, plans)
+        self.assertEqual([simulate_plan(game, plan).structure_damage[0] for plan in plans], scores, "Scores should come from the simulator")
+        self.assertEqual((plans[1], scores[1]), serial.best_plan(game, plans), "Three demolishers should do the most damage")
+        self.assertEqual([None, None, None], serial.evaluate(game, plans, timeout=0), "Nothing should finish without time")
+
+        self.assertFalse(simulate_plan(game, plans[1]).timed_out, "Simulations without a deadline should finish")
+        late = simulate_plan(game, plans[1], time.time())
+        self.assertEqual((True, 0), (late.timed_out, late.frames), "Simulations should stop at their deadline")
+
+        pool = PlanEvaluator(2)
+        try:
+            self.assertTrue(pool.start(), "Workers should start")
+            self.assertNotEqual("fork", pool._pool._mp_context.get_start_method(), "Workers should not be forked from a threaded process")
+            self.assertEqual(scores, pool.evaluate(game, plans, timeout=30), "Worker processes should score plans the same")
+        finally:
+            pool.close()
+
+    def test_turn_scheduler(self):
+        game = self.make_turn_0_map()
+        scheduler = TurnScheduler(game.config, safety_margin=0.1)
+        self.assertEqual(5, scheduler.soft_limit, "The soft limit comes from the config")
+        scheduler.soft_limit = 0.3
+
+        def build(state):
+            state.attempt_spawn("FF", [[13, 0]])
+        def broken(state):
+            state.attempt_spawn("FF", [[14, 0]])
+            raise ValueError("broken stage")
+        def anytime(state):
+            state.attempt_spawn("FF", [[12, 1]])
+            scheduler.commit(state)
+            while scheduler.time_left() > 0:
+                time.sleep(0.01)
+            state.attempt_spawn("FF", [[15, 1]])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            submitted = scheduler.run_turn(game, [build, broken, anytime])
+        self.assertEqual(['[["FF", 13, 0], ["FF", 12, 1]]', '[]'], output.getvalue().splitlines(), "Only finished and committed work should be submitted")
+        self.assertEqual([], game._build_stack, "The turn's game state should not change")
+        self.assertEqual(2, len(submitted._build_stack), "The submitted state is returned")
+
+    def test_turn_scheduler_overrun(self):
+        game = self.make_turn_0_map()
+        scheduler = TurnScheduler(game.config, safety_margin=0.1)
+        scheduler.soft_limit = 0.4
+        log = []
+
+        def slow(state):
+            while scheduler.time_left() > 0:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            log.append(("slow", scheduler.time_left()))
+            state.attempt_spawn("FF", [[13, 0]])
+        def next_turn(state):
+            log.append(("next", scheduler.time_left() > 0))
+            state.attempt_spawn("FF", [[14, 0]])
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            first = scheduler.run_turn(game, [slow])
+            second = scheduler.run_turn(game, [next_turn])
+        self.assertEqual([("slow", 0.0), ("next", True)], log, "The next turn should wait for the stage that overran")
+        self.assertEqual([], first._build_stack, "Work after the deadline should be dropped")
+        self.assertEqual(1, len(second._build_stack), "The next turn should still run its stages")
+
+    def test_strategy_overrun(self):
+        from algo_strategy import AlgoStrategy
+        game = self.make_turn_0_map()
+        turn = '{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0]}'
+
+        def play(last_step):
+            with contextlib.redirect_stdout(io.StringIO()) as output, contextlib.redirect_stderr(io.StringIO()):
+                algo = AlgoStrategy()
+                algo.on_game_start(game.config)
+                algo.scheduler.soft_limit = 0.4
+                algo.scheduler.safety_margin = 0.1
+                algo.remove_line = lambda state: last_step(algo, state)
+                algo.turn_start = time.time()
+                try:
+                    algo.on_turn(turn)
+                    algo.scheduler._worker.join()
+                finally:
+                    algo.plan_evaluator.close()
+            return output.getvalue().splitlines()
+
+        def overrun(algo, state):
+            while algo.scheduler.time_left() > 0:
+                time.sleep(0.01)
+            state.attempt_spawn("DF", [[13, 0]])
+
+        submitted = play(overrun)
+        self.assertEqual(play(lambda algo, state: None), submitted, "The defence built before the overrun should be submitted")
+        self.assertNotEqual("[]", submitted[0], "The defence should not be dropped with the overrunning step")
+
+    def test_profiling(self):
+        game = self.make_turn_0_map()
+        self.assertIs(profiling.timed("unused")(len), len, "Timing is free when profiling is disabled")
+        timed_path = profiling._wrap("find_path", game.find_path_to_edge)
+        timed_path([13, 0])
+        timed_path([13, 0])
+        game.find_path_to_edge([13, 0])
+        record = profiling.turn_record(game)
+        self.assertEqual(0, record["turn"], "The record is for turn 0")
+        self.assertEqual(2, record["calls"]["find_path"]["count"], "Only timed calls are counted")
+        self.assertEqual({"hits": 2, "misses": 1, "size": 1, "hit_rate": 2 / 3}, record["path_cache"], "Cache stats are wrong")
+        self.assertEqual({}, profiling.turn_record(game)["calls"], "Each turn should start counting afresh")
+
+    def test_replay(self):
+        game = self.make_turn_0_map()
+        turn = '{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0]}'
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,0,-1]')
+        engine_lines = [json.dumps(game.config.raw), turn, end]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "game.jsonl.gz")
+            stdin = sys.stdin
+            sys.stdin = io.StringIO("\n".join(engine_lines) + "\n")
+            try:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    replay.start_recording(path)
+                    AlgoCore().start()
+            finally:
+                replay.stop_recording()
+                sys.stdin = stdin
+            records = replay.read_recording(path)
+            self.assertEqual(["in", "in", "out", "out", "in"], [record["dir"] for record in records], "Engine lines and commands should be recorded in order")
+            self.assertEqual(engine_lines, [record["line"] for record in records if record["dir"] == "in"], "Engine lines should be recorded as read")
+
+            with contextlib.redirect_stderr(io.StringIO()):
+                report = replay.replay(AlgoCore(), path)
+        self.assertEqual(["config", "turn", "end"], [timing.kind for timing in report.timings], "Each engine message should be timed")
+        self.assertEqual((0, -1), (report.timings[1].turn, report.timings[1].frame), "The turn should be read from turnInfo")
+        self.assertTrue(report.matches_recording(), "The base algo should send the recorded commands")
+        self.assertEqual(1, report.summary()["turn"]["count"], "The summary counts messages of each kind")
+
+    def test_decode_once(self):
+        game = self.make_turn_0_map()
+        turn = '{"p2Units":[[],[],[[13,14,90.0,"2"]],[],[],[],[],[]],"turnInfo":[0,4,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,0,75.0,"1"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0]}'
+        from_string = GameState(game.config, turn)
+        from_dict = GameState(game.config, util.json_loads(turn))
+        self.assertEqual(4, from_dict.turn_number, "A decoded state should be parsed")
+        for location in ([13, 0], [13, 14]):
+            self.assertEqual(str(from_string.game_map[location]), str(from_dict.game_map[location]), "A string and a decoded state should give the same map")
+        self.assertIn(util.JSON_BACKEND, ("orjson", "ujson", "json"))
+
+        received = []
+        class Algo(AlgoCore):
+            def on_turn(self, state):
+                received.append(state)
+                super().on_turn(state)
+            def on_action_frame(self, state):
+                received.append(state)
+        frame = turn.replace('"turnInfo":[0,4,-1]', '"turnInfo":[1,4,0]')
+        end = turn.replace('"turnInfo":[0,4,-1]', '"turnInfo":[2,4,-1]')
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("\n".join([json.dumps(game.config.raw), turn, frame, end]) + "\n")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                Algo().start()
+        finally:
+            sys.stdin = stdin
+        self.assertEqual([[0, 4, -1], [1, 4, 0]], [state["turnInfo"] for state in received], "Turns and frames should be passed decoded")
+
+    def test_subscribe_events(self):
+        game = self.make_turn_0_map()
+        # The units are not valid JSON, so the frame fails if it is decoded beyond turnInfo and events
+        frame = '{"p1Units": nope, "turnInfo": [1, 3, 7], "events": {"breach": [[[13, 27], 1, 3, "5", 1], [[2, 11], 2, 3, "8", 2]], "death": [[[4, 9], 0, "3", 1, false]]}}'
+        end = '{"turnInfo":[2,3,-1],"p1Stats":[30.0,25.0,5.0,0],"p2Stats":[30.0,25.0,5.0,0],"p1Units":[],"p2Units":[]}'
+        breaches, deaths = [], []
+        algo = AlgoCore()
+        algo.subscribe("breach", breaches.append)
+        algo.subscribe("death", deaths.append)
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("\n".join([json.dumps(game.config.raw), frame, end]) + "\n")
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                algo.start()
+        finally:
+            sys.stdin = stdin
+        self.assertEqual([[2, 11]], [breach.location for breach in breaches if breach.player == 2], "Enemy breaches should be passed on")
+        self.assertEqual(2, len(breaches), "Every breach should be passed on")
+        self.assertEqual(events.DeathEvent([4, 9], 0, "3", 1, False), deaths[0], "Deaths should be named tuples")
+        self.assertEqual([1, 3, 7], events.turn_info(frame), "turnInfo should be read alone")
+
+    def test_precomputer(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("DF", [[13, 2]])
+        precomputer = Precomputer({"paths": lambda state: len(state.path_cache)})
+        def precompute():
+            precomputer.start(game)
+            self.assertTrue(precomputer.wait(), "The work should finish")
+        next_turn = '{"p2Units":[[],[],[],[],[],[],[],[]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[[13,2,90.0,"1"]],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0]}'
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            precompute()
+        matching = GameState(game.config, next_turn)
+        self.assertTrue(precomputer.adopt(matching), "Work for the projected board should be used")
+        self.assertIsNone(matching._game_map, "Adopting should not build the map")
+        self.assertEqual(56, precomputer.results["paths"], "Tasks should run after the paths from every edge tile are found")
+        matching.find_path_to_edge([13, 0])
+        self.assertEqual(1, matching.path_cache.hits, "Paths should come from the precomputed cache")
+        self.assertEqual(5, matching.get_threat_grid(1).damage_at([13, 4]), "Threat grids should follow the new map")
+        self.assertFalse(precomputer.adopt(matching), "Work is only used once")
+        self.assertEqual({"hits": 1, "misses": 0, "lookups": 1, "hit_rate": 1.0}, precomputer.stats(), "Only turns following a start should be counted")
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            precompute()
+        upgraded = GameState(game.config, next_turn.replace('[],[]],"p2Stats"', '[],[[13,2,0.0,"1"]]],"p2Stats"'))
+        self.assertFalse(precomputer.adopt(upgraded), "Work for another board should be dropped")
+        self.assertIsNone(upgraded._game_map, "Dropping should not build the map")
+        self.assertEqual({}, precomputer.results, "Task results for another board should be dropped")
+        self.assertEqual(0, len(upgraded.path_cache), "The path cache should be left alone")
+        self.assertEqual(0.5, precomputer.stats()["hit_rate"], "Dropped work should count as a miss")
+
+        busy = '{"p2Units":[[[13,14,60.0,"2"]],[],[[12,15,90.0,"3"],[13,14,90.0,"4"]],[[1,14,15.0,"5"]],[],[],[[12,15,0.0,"3"]],[[12,15,0.0,"3"]]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[3,12,75.0,"6"]],[[4,12,30.0,"7"]],[[13,2,90.0,"1"]],[],[],[],[],[[13,2,0.0,"1"],[4,12,0.0,"7"]]],"p2Stats":[30.0,25.0,5.0,0]}'
+        busy_state = GameState(game.config, busy)
+        fingerprint = state_fingerprint(busy_state)
+        self.assertIsNone(busy_state._game_map, "The turn's units should be enough")
+        self.assertEqual(board_fingerprint(busy_state.game_map), fingerprint, "Both fingerprints should agree")
+        self.assertEqual(fingerprint, state_fingerprint(busy_state), "A built map should be fingerprinted directly")
+
+    def test_unit_stats(self):
+        game = self.make_turn_0_map()
+        turret = GameUnit("DF", game.config, 0, None, 13, 3)
+        other = GameUnit("DF", game.config, 1, 40, 13, 16)
+        self.assertIs(turret.stats, other.stats, "Units of a type should share their stats")
+        self.assertEqual((90.0, 40), (turret.health, other.health), "Health defaults to the type's start health")
+        self.assertFalse(hasattr(turret, "__dict__"), "Units should be slotted")
+
+        turret.upgrade()
+        self.assertEqual((True, 15.0, 3.5, (6.0, 0)), (turret.upgraded, turret.damage_i, turret.attackRange, turret.cost), "Upgrading should swap in the upgraded stats")
+        self.assertEqual((False, 5.0, 2.5, (2.0, 0)), (other.upgraded, other.damage_i, other.attackRange, other.cost), "Other units should keep their stats")
+        self.assertIs(turret.stats, unit_stats(game.config, "DF", True), "Upgraded stats should be shared too")
+        with self.assertRaises(AttributeError):
+            turret.damage_i = 1
+
+        clone = turret._clone()
+        clone.health = 1
+        self.assertEqual((90.0, True), (turret.health, clone.upgraded), "Clones should copy the unit")
+
+    def test_unit_store(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("DF", [13, 3], 0)
+        game_map.add_unit("FF", [14, 3], 0)
+        game_map.add_unit("DF", [13, 16], 1)
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("PI", [13, 0], 0)
+        store = game_map._store
+        self.assertEqual(5, len(store), "Each unit should take a slot")
+        self.assertIs(game_map[13, 3][0], game_map[13, 3][0], "Looking at a tile twice should give the same units")
+
+        game_map[13, 3][0].health = 10
+        game_map[13, 16][0].upgrade()
+        game_map[14, 3][0].pending_removal = True
+        self.assertEqual(10, store.health[game_map._tile_slots(3 * 28 + 13)[0]], "Health should be written to the store")
+        self.assertEqual([[13, 16]], game_map.find_units(upgraded=True), "Upgrades should be written to the store")
+        self.assertEqual(15.0, game_map[13, 16][0].damage_i, "Upgraded units should read the upgraded stats")
+        self.assertEqual([[13, 3]], game_map.find_units(player_index=0, stationary=True, below_health=20))
+        self.assertEqual([[14, 3]], game_map.find_units(pending_removal=True))
+        self.assertEqual([[13, 0], [13, 0]], game_map.find_units(stationary=False))
+        self.assertEqual([[13, 3], [13, 16]], game_map.find_units(unit_type="DF"))
+
+        fork = game_map.fork()
+        fork[13, 3][0].health = 50
+        fork.remove_unit([14, 3])
+        fork.add_unit("DF", [14, 3], 1)
+        self.assertEqual((10, "FF", 0), (game_map[13, 3][0].health, game_map[14, 3][0].unit_type, game_map[14, 3][0].player_index), "Forks should not change the original")
+        self.assertEqual([[14, 3]], fork.find_units(player_index=1, unit_type="DF", upgraded=False))
+
+        game_map.remove_unit([13, 3])
+        self.assertEqual([], game_map[13, 3])
+        self.assertEqual([], game_map.find_units(stationary=True, below_health=20), "Removed units should not be found")
+        game_map[13, 3] = [turret for turret in fork[13, 3]]
+        self.assertEqual((50, 3), (game_map[13, 3][0].health, len(game_map.find_units(stationary=True))), "Setting a location should store its units")
+
+        for _ in range(3):
+            game_map.remove_unit([13, 0])
+            game_map.add_unit("PI", [13, 0], 0)
+            game_map = game_map.fork()
+            self.assertEqual(4, len(game_map._store), "Forks should leave out removed units")
+        self.assertEqual(([[13, 0]], [[14, 3], [13, 16], [13, 3]]), (game_map.find_units(stationary=False), game_map.find_units(stationary=True)), "Units should keep their tiles")
+        self.assertEqual((50, True), (game_map[13, 3][0].health, game_map[13, 16][0].upgraded), "Units should keep their state")
+        self.assertTrue(game_map.is_blocked([13, 16]) and game_map.count_structures(1, "DF") == 1, "Structures should move with their slots")
+
+    def test_tile_units(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map[13, 0].append(GameUnit("PI", game.config, 0, 5, 13, 0))
+        game_map[13, 1].append(GameUnit("FF", game.config, 1, None, 13, 1))
+        self.assertEqual([[13, 0], [13, 0]], game_map.find_units(stationary=False), "Appended units should be stored")
+        self.assertEqual(5, game_map[13, 0][1].health, "Appended units should keep their health")
+        self.assertTrue(game_map.is_blocked([13, 1]), "Appended structures should block")
+        self.assertEqual(1, game_map.count_structures(1, "FF"))
+
+        fork = game_map.fork()
+        self.assertEqual(2, len(fork[13, 0]), "Forks should keep appended units")
+        game_map[13, 0].remove(game_map[13, 0][0])
+        del game_map[13, 1][0]
+        self.assertEqual([5], [unit.health for unit in game_map[13, 0]], "The other unit should stay")
+        self.assertEqual(([[13, 0]], []), (game_map.find_units(stationary=False), game_map.find_units(stationary=True)), "Removed units should be gone")
+        self.assertFalse(game_map.is_blocked([13, 1]), "Removed structures should not block")
+        self.assertEqual(3, len(fork.find_units()), "Forks should not change with the original")
+
+    def test_parse_unit_groups(self):
+        game = self.make_turn_0_map()
+        turn = json.loads(game.serialized_string)
+        turn["p1Units"] = [[[13, 0, 75, "1"]], [], [[12, 1, 40.5, "2"], [14, 1, 90, "3"]], [[3, 10, 15, "4"], [3, 10, 15, "5"]], [], [], [[12, 1, 0, "6"]], [[14, 1, 0, "7"]]]
+        turn["p2Units"] = [[], [], [[13, 27, 90, "8"]], [], [], [[3, 10, 40, "9"]], [], [[13, 27, 0, "10"]]]
+        state = GameState(game.config, json.dumps(turn))
+        game_map = state.game_map
+        self.assertEqual(7, len(game_map._store), "Removals and upgrades should not add units")
+        self.assertEqual([[13, 0], [12, 1], [14, 1]], game_map.find_units(player_index=0, stationary=True))
+        self.assertEqual((40.5, True, False), (game_map[12, 1][0].health, game_map[12, 1][0].pending_removal, game_map[12, 1][0].upgraded))
+        self.assertEqual((False, True, 15.0), (game_map[14, 1][0].pending_removal, game_map[14, 1][0].upgraded, game_map[14, 1][0].damage_i))
+        self.assertTrue(game_map[13, 27][0].upgraded, "Upgrades should apply to either player's structures")
+        self.assertEqual([("PI", 0), ("PI", 0), ("SI", 1)], [(unit.unit_type, unit.player_index) for unit in game_map[3, 10]])
+        self.assertEqual(game_map.get_structure_mask(0, "DF"), (1 << (1 * 28 + 12)) | (1 << (1 * 28 + 14)))
+        self.assertEqual(2, len(state.get_attackers([13, 3], 1)), "Parsed structures should be seen by the attacker index")
+
+    def test_lazy_game_state(self):
+        game = self.make_turn_0_map()
+        turn = json.loads(game.serialized_string)
+        turn["p1Units"][2] = [[13, 3, 90, "1"]]
+        state = GameState(game.config, json.dumps(turn))
+        state.suppress_warnings(True)
+        self.assertEqual((0, 25.0, 5.0), (state.turn_number, state.get_resource(state.SP), state.get_resource(state.MP)))
+        self.assertEqual(["state"], list(state.construction_times), "Only the turn info, stats and resources should be decoded")
+
+        fork = state.fork()
+        self.assertEqual("DF", state.game_map[13, 3][0].unit_type)
+        self.assertFalse(state.game_map.enable_warnings, "Warnings should stay suppressed on the built map")
+        self.assertEqual(["state", "game_map"], list(state.construction_times))
+        fork.game_map.remove_unit([13, 3])
+        self.assertEqual(1, len(state.game_map[13, 3]), "A fork should build its own map")
+
+        state.find_path_to_edge([13, 0])
+        state.get_threat_grid(0)
+        self.assertEqual(["state", "game_map", "path_finder", "threat_grid"], list(profiling.turn_record(state)["construction_ms"]))
+
+    def test_game_config(self):
+        game = self.make_turn_0_map()
+        config = game.config
+        self.assertIsInstance(config, GameConfig)
+        for build in (lambda: GameState(config.raw, game.serialized_string), lambda: GameMap(config.raw), lambda: GameUnit("DF", config.raw), lambda: UnitStore(config.raw)):
+            with self.assertRaises(TypeError, msg="Config dicts should be compiled with GameConfig first"):
+                build()
+        self.assertEqual(("FF", "DF", "RM", ("FF", "EF", "DF")), (config.WALL, config.TURRET, config.REMOVE, config.STRUCTURE_TYPES))
+        self.assertEqual(((2.0, 0), (4.0, 0), 2), (config.costs["DF"], config.upgrade_costs["DF"], config.UNIT_TYPE_TO_INDEX["DF"]))
+        self.assertEqual(config.raw["unitInformation"], config["unitInformation"], "It should read like the config dict")
+        with self.assertRaises(AttributeError):
+            config.WALL = "DF"
+        self.assertIs(config, GameUnit("DF", config).config)
+
+        # Game states of different configs no longer share module globals
+        renamed = json.loads(json.dumps(config.raw))
+        renamed["unitInformation"][0]["shorthand"] = "WA"
+        other = GameState(GameConfig(renamed), game.serialized_string)
+        self.assertEqual(1, game.attempt_spawn("FF", [13, 0]))
+        self.assertEqual(1, other.attempt_spawn("WA", [13, 0]))
+        self.assertEqual([("FF", 13, 0)], game._build_stack)
+        self.assertEqual((config.SP, config.MP), (game._GameState__resource_required("FF"), game._GameState__resource_required("PI")))
 
     def test_print_unit(self):
         game = self.make_turn_0_map()
@@ -0,0 +1,177 @@
+from array import array
+from .topology import TILE_COUNT, TILE_X, TILE_Y, tile_id, attack_tiles
+
+
+class ThreatGrid:
+    """The damage per frame enemy structures deal to a mobile unit standing on each tile
+
+    Build one through GameState.get_threat_grid, which keeps it up to date with the map.
+    Scoring a path is then a sum over its tiles instead of a range search around every path point.
+
+    Attributes :
+        * player_index (int): The player whose mobile units are threatened, 0 for you 1 for the enemy
+        * damage (array): damage[tile] is the total damage_i of the opposing structures within attackRange of the tile, indexed by tile id (y * ARENA_SIZE + x)
+
+    """
+    def __init__(self, game_map, player_index):
+        """Builds the grid from the structures on a map
+
+        Args:
+            game_map: The GameMap to read structures from
+            player_index: The player whose mobile units are threatened, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self.damage = array('d', bytes(8 * TILE_COUNT))
+        self._game_map = game_map
+        self._sources = {}
+        self._changes = None
+        self.refresh()
+
+    def refresh(self):
+        """Brings the grid up to date with the map
+
+        Nothing is done unless structures were added, removed, upgraded or replaced through the map
+        since the last refresh, and then only those are restamped, so this is cheap to call whenever
+        the map may have changed.
+
+        Returns:
+            The number of tiles whose attacking structures changed
+        """
+        game_map = self._game_map
+        changes = game_map._structure_changes
+        if changes == self._changes:
+            return 0
+        self._changes = changes
+        store = game_map._store
+        structure_slots = game_map._structure_slots
+        mask = game_map.get_structure_mask(1 - self.player_index)
+        sources = {}
+        while mask:
+            low = mask & -mask
+            tile = low.bit_length() - 1
+            mask ^= low
+            stats = store.stats(structure_slots[tile])
+            if stats.damage_i > 0:
+                sources[tile] = ((stats.damage_i, stats.attackRange),)
+
+        changed = 0
+        old_sources = self._sources
+        for tile, attackers in old_sources.items():
+            if sources.get(tile) != attackers:
+                self.__stamp(tile, attackers, -1)
+                changed += 1
+        for tile, attackers in sources.items():
+            old_attackers = old_sources.get(tile)
+            if old_attackers != attackers:
+                self.__stamp(tile, attackers, 1)
+                if old_attackers is None:
+                    changed += 1
+        self._sources = sources
+        return changed
+
+    def __stamp(self, tile, attackers, sign):
+        damage = self.damage
+        for damage_i, attack_range in attackers:
+            for target in attack_tiles(tile, attack_range):
+                damage[target] += sign * damage_i
+
+    def damage_at(self, location):
+        """Gets the damage per frame to a mobile unit at a location
+
+        Args:
+            location: An in bounds location
+
+        Returns:
+            The total damage per frame from opposing structures in range
+        """
+        return self.damage[tile_id(location[0], location[1])]
+
+    def path_damage(self, path, frames_per_tile=1):
+        """Gets the damage a mobile unit takes walking a path, ignoring health and targeting
+
+        Args:
+            path: A list of locations, such as one returned by find_path_to_edge
+            frames_per_tile: How many frames the unit spends on each tile, 1/speed for a unit
+
+        Returns:
+            The summed damage over the path
+        """
+        damage = self.damage
+        return frames_per_tile * sum(damage[tile_id(x, y)] for x, y in path)
+
+    def fork(self, game_map):
+        """Copies this grid for a forked map, see GameMap.fork
+
+        Args:
+            game_map: The forked map the copy should follow, None if it is not built yet. GameState.get_threat_grid then gives it its map.
+
+        Returns:
+            A new ThreatGrid that refreshes from game_map
+        """
+        clone = ThreatGrid.__new__(ThreatGrid)
+        clone.player_index = self.player_index
+        clone.damage = array('d', self.damage)
+        clone._game_map = game_map
+        clone._sources = dict(self._sources)
+        # A forked map starts with the same change count, a map given later is checked in full
+        clone._changes = self._changes if game_map is not None else None
+        return clone
+
+
+class AttackerIndex:
+    """Maps each tile to the opposing structures that can attack a mobile unit standing on it
+
+    Build one through GameState.get_attackers, which rebuilds it lazily once structures are
+    added, removed, replaced or upgraded through the map, so a query only costs as much as the attackers it returns.
+
+    Attributes :
+        * player_index (int): The player whose mobile units are attacked, 0 for you 1 for the enemy
+
+    """
+    def __init__(self, game_map, player_index):
+        """Sets up an empty index, filled on the first call to attackers
+
+        Args:
+            game_map: The GameMap to read structures from
+            player_index: The player whose mobile units are attacked, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self._game_map = game_map
+        self._attackers = {}
+        self._changes = None
+
+    def invalidate(self):
+        """Forces a rebuild on the next query, for changes the map does not see, such as to units that are not on it
+        """
+        self._changes = None
+
+    def attackers(self, tile):
+        """Gets the structures that can attack a mobile unit on a tile
+
+        Args:
+            tile: An in bounds tile id
+
+        Returns:
+            A tuple of GameUnits, shared with the index so it must not be modified
+        """
+        changes = self._game_map._structure_changes
+        if changes != self._changes:
+            self.__rebuild()
+            self._changes = changes
+        return self._attackers.get(tile, ())
+
+    def __rebuild(self):
+        game_map = self._game_map
+        index = {}
+        mask = game_map.get_structure_mask(1 - self.player_index)
+        while mask:
+            low = mask & -mask
+            tile = low.bit_length() - 1
+            mask ^= low
+            for unit in game_map[TILE_X[tile], TILE_Y[tile]]:
+                if unit.stationary and unit.damage_i > 0:
+                    for target in attack_tiles(tile, unit.attackRange):
+                        index.setdefault(target, []).append(unit)
+        self._attackers = {target: tuple(units) for target, units in index.items()}
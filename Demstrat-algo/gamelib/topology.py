@@ -0,0 +1,262 @@
+"""
+Static tables describing the 28x28 diamond shaped board, built once at import.
+
+Tiles are identified by a tile id, tile_id = y * ARENA_SIZE + x, so tile ids follow the
+row by row order GameMap iterates in. Tables indexed by tile id cover the full 28x28 square;
+use IN_BOUNDS to tell which of those tiles are part of the arena.
+"""
+import math
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+TILE_COUNT = ARENA_SIZE * ARENA_SIZE
+
+# Edge and quadrant constants, the same values as GameMap.TOP_RIGHT and similar
+TOP_RIGHT = 0
+TOP_LEFT = 1
+BOTTOM_LEFT = 2
+BOTTOM_RIGHT = 3
+
+
+def tile_id(x, y):
+    """Gets the tile id of a location
+
+    Args:
+        x: The x coordinate, should be inside the 28x28 square
+        y: The y coordinate, should be inside the 28x28 square
+
+    Returns:
+        The tile id, y * ARENA_SIZE + x
+    """
+    return int(y) * ARENA_SIZE + int(x)
+
+
+def _diamond_contains(x, y):
+    """The diamond row math of GameMap.in_arena_bounds, used to build IN_BOUNDS and for non integer locations
+    """
+    row_size = y + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    top_half_check = (y < HALF_ARENA and x >= startx and x <= endx)
+
+    row_size = (ARENA_SIZE - 1 - y) + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    bottom_half_check = (y >= HALF_ARENA and x >= startx and x <= endx)
+
+    return bottom_half_check or top_half_check
+
+
+TILE_X = tuple(tile % ARENA_SIZE for tile in range(TILE_COUNT))
+TILE_Y = tuple(tile // ARENA_SIZE for tile in range(TILE_COUNT))
+TILE_XY = tuple(zip(TILE_X, TILE_Y))
+
+IN_BOUNDS = bytes(1 if _diamond_contains(x, y) else 0 for x, y in TILE_XY)
+IN_BOUNDS_TILES = tuple(tile for tile in range(TILE_COUNT) if IN_BOUNDS[tile])
+
+
+def in_bounds(x, y):
+    """Checks if a location is inside the diamond shaped game board, see GameMap.in_arena_bounds
+    """
+    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+        try:
+            return IN_BOUNDS[y * ARENA_SIZE + x] == 1
+        except TypeError:
+            return _diamond_contains(x, y)
+    return False
+
+
+def _build_neighbors():
+    # Keeps the [x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y] order of ShortestPathFinder._get_neighbors,
+    # the pathfinding tie-break depends on it
+    neighbors = []
+    for x, y in TILE_XY:
+        adjacent = []
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[ny * ARENA_SIZE + nx]:
+                adjacent.append(ny * ARENA_SIZE + nx)
+        neighbors.append(tuple(adjacent))
+    return tuple(neighbors)
+
+
+NEIGHBORS = _build_neighbors()
+
+
+def _build_edges():
+    # Same order as GameMap.get_edges, [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right
+    top_right = [(HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)]
+    top_left = [(HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)]
+    bottom_left = [(HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA)]
+    bottom_right = [(HALF_ARENA + num, num) for num in range(HALF_ARENA)]
+    return tuple(tuple(edge) for edge in (top_right, top_left, bottom_left, bottom_right))
+
+
+EDGE_LOCATIONS = _build_edges()
+EDGE_TILES = tuple(tuple(y * ARENA_SIZE + x for x, y in edge) for edge in EDGE_LOCATIONS)
+EDGE_MASKS = tuple(bytes(1 if tile in edge else 0 for tile in range(TILE_COUNT)) for edge in map(frozenset, EDGE_TILES))
+FRIENDLY_EDGE_MASK = bytes(a | b for a, b in zip(EDGE_MASKS[BOTTOM_LEFT], EDGE_MASKS[BOTTOM_RIGHT]))
+ENEMY_EDGE_MASK = bytes(a | b for a, b in zip(EDGE_MASKS[TOP_LEFT], EDGE_MASKS[TOP_RIGHT]))
+
+
+def locations_mask(locations):
+    """Builds a bitboard from locations, see GameMap.get_structure_mask
+
+    Args:
+        locations: A list of [x, y] locations, out of bounds locations are ignored
+
+    Returns:
+        An int with bit tile_id(x, y) set for each location
+    """
+    mask = 0
+    for x, y in locations:
+        if in_bounds(x, y):
+            mask |= 1 << tile_id(x, y)
+    return mask
+
+
+def mask_tiles(mask):
+    """Lists the tile ids of the bits set in a bitboard
+
+    Args:
+        mask: An int bitboard
+
+    Returns:
+        A list of tile ids in increasing order
+    """
+    tiles = []
+    while mask:
+        low = mask & -mask
+        tiles.append(low.bit_length() - 1)
+        mask ^= low
+    return tiles
+
+
+def on_edge(tile, edge):
+    """Checks if a tile is on one of the four edges
+
+    Args:
+        tile: A tile id
+        edge: TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT or BOTTOM_RIGHT
+
+    Returns:
+        True if the tile is on the edge
+    """
+    return EDGE_MASKS[edge][tile] == 1
+
+
+def _quadrant(x, y):
+    left = x < HALF_ARENA
+    bottom = y < HALF_ARENA
+    if bottom:
+        return BOTTOM_LEFT if left else BOTTOM_RIGHT
+    return TOP_LEFT if left else TOP_RIGHT
+
+
+# The quadrant a tile lies in, and the edge a unit spawned there targets, see GameState.get_target_edge
+QUADRANT = tuple(_quadrant(x, y) for x, y in TILE_XY)
+_OPPOSITE = {TOP_RIGHT: BOTTOM_LEFT, TOP_LEFT: BOTTOM_RIGHT, BOTTOM_LEFT: TOP_RIGHT, BOTTOM_RIGHT: TOP_LEFT}
+TARGET_EDGE = tuple(_OPPOSITE[quadrant] for quadrant in QUADRANT)
+
+# Mirrors: MIRROR_X flips left and right, MIRROR_Y flips bottom and top,
+# MIRROR flips both which maps a tile to the matching tile from the opponent's point of view
+MIRROR_X = tuple(y * ARENA_SIZE + (ARENA_SIZE - 1 - x) for x, y in TILE_XY)
+MIRROR_Y = tuple((ARENA_SIZE - 1 - y) * ARENA_SIZE + x for x, y in TILE_XY)
+MIRROR = tuple(MIRROR_Y[MIRROR_X[tile]] for tile in range(TILE_COUNT))
+
+
+def _build_idealness():
+    # Idealness for each of the four edge directions, see ShortestPathFinder._get_idealness
+    idealness = {}
+    for dx in (1, -1):
+        for dy in (1, -1):
+            idealness[(dx, dy)] = tuple((28 * y if dy == 1 else 28 * (27 - y)) + (x if dx == 1 else 27 - x) for x, y in TILE_XY)
+    return idealness
+
+
+IDEALNESS = _build_idealness()
+
+
+_DISC_OFFSETS = {}
+_DISC_TILES = {}
+_ATTACK_TILES = {}
+
+
+def disc_offsets(radius, hit_radius):
+    """Gets the offsets of the locations a unit with the given range affects
+
+    A location is affected when its center is within radius + hit_radius of the unit, searching the square
+    of half width ceil(radius) around it, the same rule as GameMap.get_locations_in_range.
+
+    Args:
+        radius: The range of the unit
+        hit_radius: The getHitRadius from the game config
+
+    Returns:
+        A tuple of (dx, dy) offsets in the order get_locations_in_range scans them
+    """
+    key = (radius, hit_radius)
+    offsets = _DISC_OFFSETS.get(key)
+    if offsets is None:
+        search_radius = math.ceil(radius)
+        offsets = tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+                        if math.sqrt(dx ** 2 + dy ** 2) < radius + hit_radius)
+        _DISC_OFFSETS[key] = offsets
+    return offsets
+
+
+def disc_tiles(tile, radius, hit_radius):
+    """Gets the in bounds tiles a unit on the given tile with the given range affects, see disc_offsets
+
+    Results are computed once per tile and range, then shared, so callers must not modify them.
+
+    Args:
+        tile: The tile id of the unit, must be in bounds
+        radius: The range of the unit
+        hit_radius: The getHitRadius from the game config
+
+    Returns:
+        A tuple of tile ids
+    """
+    key = (radius, hit_radius)
+    per_tile = _DISC_TILES.get(key)
+    if per_tile is None:
+        per_tile = _DISC_TILES[key] = [None] * TILE_COUNT
+    tiles = per_tile[tile]
+    if tiles is None:
+        tiles = per_tile[tile] = _offset_tiles(tile, disc_offsets(radius, hit_radius))
+    return tiles
+
+
+def attack_tiles(tile, attack_range):
+    """Gets the in bounds tiles whose centers are at most attack_range from a tile
+
+    This is the rule a structure uses to decide what it can shoot, so unlike disc_tiles there is no hit radius
+    and tiles exactly attack_range away are included. Results are shared, so callers must not modify them.
+
+    Args:
+        tile: The tile id of the structure, must be in bounds
+        attack_range: The attackRange of the structure
+
+    Returns:
+        A tuple of tile ids
+    """
+    per_tile = _ATTACK_TILES.get(attack_range)
+    if per_tile is None:
+        per_tile = _ATTACK_TILES[attack_range] = [None] * TILE_COUNT
+    tiles = per_tile[tile]
+    if tiles is None:
+        search_radius = math.ceil(attack_range)
+        offsets = [(dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+                   if math.sqrt(dx ** 2 + dy ** 2) <= attack_range]
+        tiles = per_tile[tile] = _offset_tiles(tile, offsets)
+    return tiles
+
+
+def _offset_tiles(tile, offsets):
+    x, y = TILE_X[tile], TILE_Y[tile]
+    tiles = []
+    for dx, dy in offsets:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_BOUNDS[ny * ARENA_SIZE + nx]:
+            tiles.append(ny * ARENA_SIZE + nx)
+    return tuple(tiles)
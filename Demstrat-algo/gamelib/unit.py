@@ -1,3 +1,7 @@
+from operator import attrgetter
+from .game_config import check_config
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,15 +13,33 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+def unit_stats(config, unit_type, upgraded=False):
+    """Gets the stats of a unit type, built once per config
+
+    Args:
+        config: The GameConfig
+        unit_type: The shorthand of a unit type
+        upgraded: True for the stats after an upgrade
+
+    Returns:
+        The UnitStats
+    """
+    return check_config(config).stats[unit_type, upgraded]
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of a unit are read from a UnitStats record shared by all units of its type,
+    so they can not be changed on a single unit. Upgrading a unit swaps its record.
+
     Attributes :
         * unit_type (string): This unit's type
-        * config (JSON): Contains information about the game
+        * config (GameConfig): Contains information about the game
         * player_index (integer): The player that controls this unit. 0 for you, 1 for your opponent.
         * x (integer): The x coordinate of the unit
         * y (integer): The y coordinate of the unit
+        * stats (UnitStats): The stats of this unit's type, the fields below are read from it
         * stationary (bool): Whether or not this unit is a structures
         * speed (float): A unit will move once every 1/speed frames
         * damage_f (int): The amount of damage this mobile unit will deal to enemy structures.
@@ -26,53 +48,57 @@ class GameUnit:
         * shieldRange (float): The effective range of this unit for shielding
         * max_health (float): The starting health of this unit. Note than 'health' can be increased beyond this value by shielding in some game configurations.
         * health (float): The current health of this unit
-        * cost ([int, int]): The resource costs of this unit first is SP second is MP
+        * cost ((int, int)): The resource costs of this unit first is SP second is MP
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
 
     """
+    __slots__ = ("unit_type", "config", "player_index", "x", "y", "health", "pending_removal", "stats")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
-        """ Initialize unit variables using args passed
+        """ Initialize unit variables using args passed, config is the GameConfig
 
         """
         self.unit_type = unit_type
-        self.config = config
+        self.config = config = check_config(config)
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
-
+        self.stats = config.stats[unit_type, False]
+        self.health = self.stats.max_health if not health else health
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
+        self.stats = self.config.stats[self.unit_type, True]
 
+    stationary = property(attrgetter("stats.stationary"))
+    speed = property(attrgetter("stats.speed"))
+    damage_f = property(attrgetter("stats.damage_f"))
+    damage_i = property(attrgetter("stats.damage_i"))
+    attackRange = property(attrgetter("stats.attackRange"))
+    shieldRange = property(attrgetter("stats.shieldRange"))
+    max_health = property(attrgetter("stats.max_health"))
+    shieldPerUnit = property(attrgetter("stats.shieldPerUnit"))
+    cost = property(attrgetter("stats.cost"))
+    upgraded = property(attrgetter("stats.upgraded"))
+
+    def _clone(self):
+        """Makes an independent copy of this unit that shares its config and stats
+
+        Returns:
+            A new GameUnit with the same type, owner, location, health and stats
+        """
+        clone = GameUnit.__new__(GameUnit)
+        clone.unit_type = self.unit_type
+        clone.config = self.config
+        clone.player_index = self.player_index
+        clone.x = self.x
+        clone.y = self.y
+        clone.health = self.health
+        clone.pending_removal = self.pending_removal
+        clone.stats = self.stats
+        return clone
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
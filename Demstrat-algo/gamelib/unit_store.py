@@ -0,0 +1,272 @@
+from array import array
+from itertools import compress
+from .game_config import check_config
+from .unit import GameUnit
+
+
+class UnitStore:
+    """Holds the units of a GameMap as parallel arrays, one entry (slot) per unit
+
+    A slot stays valid for the life of the store. Removed units are marked dead rather than
+    deleted, so slots never move. Copies leave the dead slots out, so the store only grows
+    with the units removed since the map was last forked, see copy and slot_map. Board wide
+    queries are filters over the columns, see select, and GameMap hands out StoredUnit views
+    of the slots for game_map[x, y].
+
+    Attributes :
+        * config (GameConfig): Contains information about the game
+        * unit_types (tuple): The shorthand of each type id, the index of the type in the config's unitInformation
+        * x (array): The x coordinate of each unit
+        * y (array): The y coordinate of each unit
+        * type_id (array): The type id of each unit
+        * owner (array): The player controlling each unit, 0 for you 1 for the enemy
+        * health (array): The current health of each unit
+        * upgraded (array): 1 for upgraded units
+        * pending_removal (array): 1 for units their owner marked for removal
+        * alive (array): 0 for units that were removed from the map
+        * structure_changes (int): Bumped whenever structures are added, removed, replaced or upgraded, see AttackerIndex
+
+    """
+    def __init__(self, config):
+        """Makes an empty store
+
+        Args:
+            config: The GameConfig
+
+        """
+        self.config = config = check_config(config)
+        self.unit_types = config.unit_types
+        self.type_ids = config.UNIT_TYPE_TO_INDEX
+        self._stats = [(config.stats[unit_type, False], config.stats[unit_type, True]) if unit_type else (None, None)
+                       for unit_type in self.unit_types]
+        self._stationary = bytes(1 if stats[0] and stats[0].stationary else 0 for stats in self._stats)
+        self.x = array('b')
+        self.y = array('b')
+        self.type_id = array('b')
+        self.owner = array('b')
+        self.health = array('d')
+        self.upgraded = array('b')
+        self.pending_removal = array('b')
+        self.alive = array('b')
+        self.structure_changes = 0
+
+    def __len__(self):
+        return len(self.alive)
+
+    def add(self, type_id, player_index, health, x, y, upgraded=False, pending_removal=False):
+        """Adds a unit
+
+        Args:
+            type_id: The index of the unit's type in unitInformation
+            player_index: The player controlling the unit
+            health: The unit's health, its type's start health if None or 0
+            x: The x coordinate of the unit
+            y: The y coordinate of the unit
+            upgraded: If the unit is upgraded
+            pending_removal: If the unit is marked for removal
+
+        Returns:
+            The slot of the new unit
+        """
+        stats = self._stats[type_id][1 if upgraded else 0]
+        self.x.append(x)
+        self.y.append(y)
+        self.type_id.append(type_id)
+        self.owner.append(player_index)
+        self.health.append(health if health else stats.max_health)
+        self.upgraded.append(1 if upgraded else 0)
+        self.pending_removal.append(1 if pending_removal else 0)
+        self.alive.append(1)
+        return len(self.alive) - 1
+
+    def extend(self, type_id, player_index, xs, ys, healths):
+        """Adds many units of one type and player at once, without upgrades or removal marks
+
+        Args:
+            type_id: The index of the units' type in unitInformation
+            player_index: The player controlling the units
+            xs: An array('b') of the x coordinates of the units
+            ys: An array('b') of the y coordinates of the units, as many as xs
+            healths: An iterable of the units' health, as many as xs
+
+        Returns:
+            The slot of the first unit, the others follow it
+        """
+        first = len(self.alive)
+        count = len(xs)
+        self.x.extend(xs)
+        self.y.extend(ys)
+        self.type_id.extend(array('b', [type_id]) * count)
+        self.owner.extend(array('b', [player_index]) * count)
+        self.health.extend(healths)
+        self.upgraded.extend(bytes(count))
+        self.pending_removal.extend(bytes(count))
+        self.alive.extend(b"\x01" * count)
+        return first
+
+    def kill(self, slot):
+        """Marks a unit as removed from the map
+
+        Args:
+            slot: The unit's slot
+        """
+        self.alive[slot] = 0
+
+    def stats(self, slot):
+        """Gets the stats of a unit
+
+        Args:
+            slot: The unit's slot
+
+        Returns:
+            The shared UnitStats of the unit's type, upgraded or not
+        """
+        return self._stats[self.type_id[slot]][self.upgraded[slot]]
+
+    def is_stationary(self, slot):
+        """Checks if a unit is a structure
+
+        Args:
+            slot: The unit's slot
+
+        Returns:
+            True for structures
+        """
+        return self._stationary[self.type_id[slot]] == 1
+
+    def copy(self):
+        """Makes an independent copy of the store without its dead slots
+
+        Live units keep their order, so the slots stay the same unless some units died. Then
+        each slot moves down by the number of dead slots before it, see slot_map.
+
+        Returns:
+            A new UnitStore
+        """
+        clone = UnitStore.__new__(UnitStore)
+        clone.__dict__.update(self.__dict__)
+        runs = self.__live_runs()
+        for column in ("x", "y", "type_id", "owner", "health", "upgraded", "pending_removal", "alive"):
+            values = getattr(self, column)
+            if len(runs) == 1:
+                copied = values[runs[0][0]:runs[0][1]]
+            else:
+                copied = array(values.typecode)
+                for first, end in runs:
+                    copied += values[first:end]
+            setattr(clone, column, copied)
+        return clone
+
+    def slot_map(self):
+        """Gets the slot each unit has in a copy of the store
+
+        Returns:
+            An array('i') of the new slot of each slot, -1 for dead slots. It ends with an extra -1, so -1 maps to itself.
+        """
+        new_slots = array('i', [-1]) * (len(self.alive) + 1)
+        new_slot = 0
+        for first, end in self.__live_runs():
+            new_slots[first:end] = array('i', range(new_slot, new_slot + end - first))
+            new_slot += end - first
+        return new_slots
+
+    def __live_runs(self):
+        # The (first, end) slot ranges of live units, found with bytes.find as few units die between forks
+        alive = self.alive.tobytes()
+        runs = []
+        first = 0
+        dead = alive.find(0)
+        while dead != -1:
+            if dead > first:
+                runs.append((first, dead))
+            first = dead + 1
+            dead = alive.find(0, first)
+        runs.append((first, len(alive)))
+        return runs
+
+    def select(self, player_index=None, unit_type=None, stationary=None, upgraded=None, pending_removal=None, below_health=None):
+        """Finds the live units matching all the given filters
+
+        Args:
+            player_index: Only units of this player, 0 for you 1 for the enemy
+            unit_type: Only units of this type
+            stationary: Only structures if True, only mobile units if False
+            upgraded: Only upgraded units if True, only units that are not if False
+            pending_removal: Only units marked for removal if True, only units that are not if False
+            below_health: Only units with less health than this
+
+        Returns:
+            A list of slots, in the order the units were added
+        """
+        slots = compress(range(len(self.alive)), self.alive)
+        if unit_type is not None:
+            type_id, types = self.type_ids.get(unit_type, -1), self.type_id
+            slots = (slot for slot in slots if types[slot] == type_id)
+        if player_index is not None:
+            owner = self.owner
+            slots = (slot for slot in slots if owner[slot] == player_index)
+        if stationary is not None:
+            stationary_types, types, wanted = self._stationary, self.type_id, 1 if stationary else 0
+            slots = (slot for slot in slots if stationary_types[types[slot]] == wanted)
+        if upgraded is not None:
+            column, wanted = self.upgraded, 1 if upgraded else 0
+            slots = (slot for slot in slots if column[slot] == wanted)
+        if pending_removal is not None:
+            column, wanted = self.pending_removal, 1 if pending_removal else 0
+            slots = (slot for slot in slots if column[slot] == wanted)
+        if below_health is not None:
+            health = self.health
+            slots = (slot for slot in slots if health[slot] < below_health)
+        return list(slots)
+
+
+class StoredUnit(GameUnit):
+    """A GameUnit that reads and writes its health, removal mark and upgrade in a UnitStore
+
+    GameMap hands these out for game_map[x, y], so changes made through them are seen by
+    board wide queries. They behave like any other GameUnit.
+
+    """
+    __slots__ = ("_store", "_slot")
+
+    def __init__(self, store, slot):
+        """Makes a view of a unit in a store
+
+        Args:
+            store: The UnitStore
+            slot: The unit's slot
+
+        """
+        self._store = store
+        self._slot = slot
+        self.unit_type = store.unit_types[store.type_id[slot]]
+        self.config = store.config
+        self.player_index = store.owner[slot]
+        self.x = store.x[slot]
+        self.y = store.y[slot]
+
+    def __get_health(self):
+        return self._store.health[self._slot]
+
+    def __set_health(self, health):
+        self._store.health[self._slot] = health
+
+    def __get_pending_removal(self):
+        return self._store.pending_removal[self._slot] == 1
+
+    def __set_pending_removal(self, pending_removal):
+        self._store.pending_removal[self._slot] = 1 if pending_removal else 0
+
+    def __get_stats(self):
+        store, slot = self._store, self._slot
+        return store._stats[store.type_id[slot]][store.upgraded[slot]]
+
+    def __set_stats(self, stats):
+        # GameUnit.upgrade assigns the upgraded stats, only the upgrade itself is kept
+        store = self._store
+        store.upgraded[self._slot] = 1 if stats.upgraded else 0
+        store.structure_changes += 1
+
+    health = property(__get_health, __set_health)
+    pending_removal = property(__get_pending_removal, __set_pending_removal)
+    stats = property(__get_stats, __set_stats)
@@ -1,8 +1,25 @@
+import json
 import sys
 
+# Engine messages are decoded with the fastest JSON library installed, orjson then ujson, else the standard library
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+        JSON_BACKEND = "ujson"
+    except ImportError:
+        json_loads = json.loads
+        JSON_BACKEND = "json"
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+# The replay.Recorder the protocol is teed to, set by replay.start_recording
+_recorder = None
+
 
 def get_command():
     """Gets input from stdin
@@ -19,6 +36,8 @@ def get_command():
         # Don't change or starter-algo process won't exit even though the game has closed
         debug_write("Got EOF, parent game process must have died, exiting for cleanup")
         sys.exit()
+    if _recorder is not None:
+        _recorder.record("in", ret)
     return ret
 
 def send_command(cmd):
@@ -26,7 +45,10 @@ def send_command(cmd):
     Should usually only be called by 'GameState.submit_turn()'
 
     """
-    sys.stdout.write(cmd.strip() + "\n")
+    cmd = cmd.strip()
+    if _recorder is not None:
+        _recorder.record("out", cmd)
+    sys.stdout.write(cmd + "\n")
     sys.stdout.flush()
 
 def debug_write(*msg):